@@ -0,0 +1,60 @@
+'''
+Zone backups from the command line. Backups are online (db_server may keep
+running); restores must be done with db_server (or the zone's worker) stopped.
+
+    python3 backup_zone.py backup db/zone3.sqlite                # -> db/backups/zone3-<UTC>.sqlite.gz
+    python3 backup_zone.py verify db/backups/zone3-20250101T000000.000000Z.sqlite.gz
+    python3 backup_zone.py restore db/backups/zone3-20250101T000000.000000Z.sqlite.gz db/zone3.sqlite
+    python3 backup_zone.py list
+
+A running db_server also backs zones up on its own every BACKUP_INTERVAL
+seconds, or on demand with `POST /backup/{zone}`.
+'''
+import os
+import sys
+import argparse
+from pathlib import Path
+
+from engine import backups
+
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", Path(__file__).parent.resolve() / 'db' / 'backups'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('backup', help="online backup of a zone file")
+    p.add_argument('zone_file', type=Path)
+    p.add_argument('--dest', type=Path, default=BACKUP_DIR)
+
+    p = commands.add_parser('verify', help="check an archive against its .sha256")
+    p.add_argument('archive', type=Path)
+
+    p = commands.add_parser('restore', help="replace a zone file with an archive (server stopped)")
+    p.add_argument('archive', type=Path)
+    p.add_argument('zone_file', type=Path)
+
+    p = commands.add_parser('list', help="list archives")
+    p.add_argument('--dest', type=Path, default=BACKUP_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        def progress(status, remaining, total):
+            print(f"\r{args.zone_file.name}: {total - remaining}/{total} pages", end='', file=sys.stderr)
+        archive = backups.snapshot(args.zone_file, args.dest, progress=progress)
+        print(file=sys.stderr)
+        print(archive)
+
+    elif args.command == 'verify':
+        ok = backups.verify(args.archive)
+        print(f"{args.archive.name}: {'OK' if ok else 'FAILED'}")
+        sys.exit(0 if ok else 1)
+
+    elif args.command == 'restore':
+        aside = backups.restore(args.archive, args.zone_file)
+        print(f"Restored {args.zone_file} from {args.archive.name} (previous file moved to {aside.name})")
+
+    elif args.command == 'list':
+        for archive in sorted(args.dest.glob("*.sqlite.gz")):
+            print(f"{archive.stat().st_size:>12,}  {archive.name}")
@@ -0,0 +1,54 @@
+'''
+Time ``databases.genesis_many`` (cold and memoized) against the scalar
+``entity_genesis`` for whole tiles.
+
+    python -m benchmarks.genesis --tiles 2000
+
+Conformance with ``entity_genesis`` is covered by ``tests/test_genesis.py``.
+'''
+import argparse
+import random
+import statistics
+import time
+
+from engine import databases, mapmath
+
+def tile_points(tx: int, ty: int, z: int) -> list[tuple[int, int, int]]:
+    xs, ys = mapmath.expand_sequence(tx), mapmath.expand_sequence(ty)
+    return [(x, y, z) for y in ys for x in xs]
+
+def summarize(label: str, samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1e6
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1e6
+    return f'{label:<10} p50={p50:9.1f}us  p99={p99:9.1f}us  per cell={p50 / 64:6.2f}us'
+
+def run(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    tiles = [tile_points(rng.randrange(512), rng.randrange(512), rng.choice(databases.ZONE_INTEGERS)) for _ in range(n)]
+    databases._genesis_memo.clear()
+
+    scalar, cold, warm = [], [], []
+    for points in tiles:
+        t = time.perf_counter()
+        [databases.entity_genesis(*p) for p in points]
+        scalar.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        databases.genesis_many(points)
+        cold.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        databases.genesis_many(points)
+        warm.append(time.perf_counter() - t)
+
+    print(f'--- {n} tiles of 64 empty cells')
+    print(summarize('scalar', scalar))
+    print(summarize('batch', cold))
+    print(summarize('memoized', warm))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tiles', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.tiles)
@@ -0,0 +1,130 @@
+'''
+Compare ``EntityStore.range_query`` against the legacy B-tree/GROUP BY plan.
+
+    python -m benchmarks.range_query --sizes 10000 100000 1000000
+
+Each size gets a fresh zone file in a temporary directory, populated
+directly with SQL and then opened through ``EntityStore.init()`` so every
+derived index is backfilled the same way an existing zone would be.
+'''
+import argparse
+import asyncio
+import json
+import math
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import anyio
+
+from engine import databases
+
+LEGACY_SQL = """
+    SELECT e.*
+    FROM entities e
+    JOIN (
+        SELECT "index", MAX("iter") AS max_iter
+        FROM entities
+        WHERE positionX BETWEEN ? AND ?
+        AND positionY BETWEEN ? AND ?
+        GROUP BY "index"
+    ) latest
+    ON e."index" = latest."index"
+    AND e."iter" = latest.max_iter
+    LIMIT ?
+"""
+
+def populate(path: Path, count: int, seed: int = 0) -> int:
+    '''Write ``count`` entity rows onto a square grid about twice as large as needed.'''
+    rng = random.Random(seed)
+    side = int(math.sqrt(count) * 1.5) + 8
+    aesthetics = json.dumps(databases.DeterministicAesthetic(0, 0, 0))
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute(databases.unwrap_kv_to_create_schema(databases.ENTITYSCHEMA, 'entities'))
+    conn.execute("BEGIN")
+    cells = set()
+    index = 0
+    while index < count:
+        x, y = rng.randint(1, side), rng.randint(1, side)
+        if (x, y) in cells:
+            continue
+        cells.add((x, y))
+        # Roughly one cell in ten carries a stack of iterations
+        for it in range(rng.choice([1] * 9 + [3])):
+            index += 1
+            conn.execute(
+                'INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (index, it, f'{x}:{y}', 1, 'bench', '', x, y,
+                 aesthetics, f'owner-{index % 97}', 1, time.time())
+            )
+    conn.execute("COMMIT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pos ON entities(positionX, positionY)")
+    conn.close()
+    return side
+
+def tiles(side: int, n: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        tx, ty = rng.randrange(side // 8), rng.randrange(side // 8)
+        out.append({
+            'min_x': tx * 8 + 1, 'max_x': tx * 8 + 8,
+            'min_y': ty * 8 + 1, 'max_y': ty * 8 + 8,
+            'limit': 64
+        })
+    return out
+
+def summarize(label: str, samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1e6
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1e6
+    return f'{label:<10} p50={p50:9.1f}us  p99={p99:9.1f}us'
+
+async def run(count: int, queries: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'zone_bench.sqlite'
+        side = populate(path, count)
+        bounds = tiles(side, queries)
+
+        store = databases.EntityStore(path, pool_size=1)
+        store._tiles.max_entries = 0  # measure the query plan, not the tile cache
+        started = time.perf_counter()
+        await store.init()
+        init_cost = time.perf_counter() - started
+
+        # Same thread hop and row decoding as the store, so only the plan differs
+        legacy = sqlite3.connect(path, check_same_thread=False)
+        legacy_samples, store_samples = [], []
+        for b in bounds:
+            params = (b['min_x'], b['max_x'], b['min_y'], b['max_y'], b['limit'])
+            t = time.perf_counter()
+            rows = await anyio.to_thread.run_sync(lambda: legacy.execute(LEGACY_SQL, params).fetchall())
+            expected = [store._row_to_dict(r) for r in rows]
+            legacy_samples.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            got = await store.range_query(b)
+            store_samples.append(time.perf_counter() - t)
+
+            assert len(got) == len(expected), (b, len(got), len(expected))
+
+        legacy.close()
+        await store.close()
+
+    print(f'--- {count:,} entities, {queries} tiles (init/backfill {init_cost:.2f}s)')
+    print(summarize('legacy', legacy_samples))
+    print(summarize('store', store_samples))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        asyncio.run(run(size, args.queries))
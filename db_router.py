@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+# NOTE : Process-per-zone sharding for the database server.
+#
+#        ZONE_GROUPS=4 python3 db_router.py
+#
+#        Starts one `db_server.py` worker process per zone group, each owning
+#        its zones (DB_ZONES) behind a unix socket, then serves the regular
+#        db_server API on :9401 and forwards every request to the worker that
+#        owns its zone. Workers have their own GIL, caches and flush loops, so
+#        a heavy flush in one group does not stall the others.
+
+from engine import verbose, versioning, databases, caching
+
+import os, sys, json, time, signal, subprocess
+import asyncio
+
+from pathlib     import Path
+from typing      import Any, Dict, List
+from contextlib  import asynccontextmanager
+
+import httpx
+
+from fastapi                 import FastAPI, HTTPException, status, Request, Response
+from fastapi.responses       import StreamingResponse
+from starlette.background    import BackgroundTask
+from fastapi.middleware.cors import CORSMiddleware
+
+Tee = verbose.T()
+
+ExtendToParentResource = lambda *args: Path(os.path.join(Path(__file__).parent.resolve(), *args))
+
+# Either a number of groups (zones dealt round-robin, 16 = one process per
+# zone) or explicit groups, e.g. "0,1,2,3;4,5,6,7;8-15".
+ZONE_GROUPS     = os.getenv("ZONE_GROUPS", str(os.cpu_count() or 1))
+SOCKET_DIR      = Path(os.getenv("DB_SOCKET_DIR", ExtendToParentResource('db', 'run')))
+WORKER_TIMEOUT  = float(os.getenv("WORKER_TIMEOUT", 60.0)) # seconds to wait for a worker to bind
+FORWARD_TIMEOUT = float(os.getenv("FORWARD_TIMEOUT", 30.0)) # seconds a forwarded request may take
+MAX_POINTS      = databases.EXPAND_MANY_MAX # same cap as db_server's /expandmany
+
+# Routes (first path segment) that may run longer than FORWARD_TIMEOUT; None = wait for the worker
+ROUTE_TIMEOUTS = {
+    'backup':   None,  # copies a whole zone file
+    'export':   None,  # streamed
+    'timeline': None,  # streamed
+}
+
+def route_timeout(request: Request) -> float | None:
+    return ROUTE_TIMEOUTS.get(request.url.path.split('/')[1], FORWARD_TIMEOUT)
+
+def parse_zone_groups(spec: str, zones: list[int] = databases.ZONE_INTEGERS) -> list[list[int]]:
+    '''
+    >>> parse_zone_groups("4")[0]
+    [0, 4, 8, 12]
+    >>> parse_zone_groups("0-3;4,5")
+    [[0, 1, 2, 3], [4, 5]]
+    '''
+    spec = spec.strip()
+    if spec.isdigit():
+        n = max(1, min(int(spec), len(zones)))
+        return [zones[i::n] for i in range(n)]
+
+    groups = []
+    for part in spec.split(";"):
+        group = []
+        for item in filter(None, (i.strip() for i in part.split(","))):
+            lo, _, hi = item.partition("-")
+            group.extend(range(int(lo), int(hi or lo) + 1))
+        if group:
+            groups.append(group)
+
+    flat = [z for g in groups for z in g]
+    if len(flat) != len(set(flat)) or not set(flat) <= set(zones):
+        raise ValueError(f"ZONE_GROUPS must name each zone at most once: {spec!r}")
+    return groups
+
+class Worker:
+    '''One `db_server.py` process serving a group of zones over a unix socket.'''
+    def __init__(self, n: int, zones: list[int]):
+        self.name = f"group{n}"
+        self.zones = zones
+        self.socket = SOCKET_DIR / f"{self.name}.sock"
+        self.process: subprocess.Popen | None = None
+        self.restarts = 0
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=str(self.socket)),
+            base_url=f"http://{self.name}",
+            timeout=FORWARD_TIMEOUT
+        )
+
+    def spawn(self, cache_bytes: int):
+        self.socket.unlink(missing_ok=True)
+        env = {
+            **os.environ,
+            "DB_ZONES": ",".join(map(str, self.zones)),
+            "DB_UDS": str(self.socket),
+            "CACHE_MEMORY_BYTES": str(cache_bytes),
+        }
+        # Own session: a terminal Ctrl-C reaches only the router, which then
+        # stops the workers in order instead of racing the supervisor
+        self.process = subprocess.Popen(
+            [sys.executable, str(ExtendToParentResource('db_server.py'))],
+            env=env,
+            start_new_session=True
+        )
+        Tee.log(f"[router] {self.name} (pid {self.process.pid}) zones={self.zones}")
+
+    async def ready(self, timeout: float = WORKER_TIMEOUT):
+        # uvicorn only binds the socket after the lifespan (zone init) finished
+        deadline = time.monotonic() + timeout
+        while not self.socket.exists():
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with code {self.process.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{self.name} did not bind {self.socket} within {timeout}s")
+            await asyncio.sleep(0.05)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=WORKER_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.socket.unlink(missing_ok=True)
+
+GROUPS = [Worker(n, zones) for n, zones in enumerate(parse_zone_groups(ZONE_GROUPS))]
+ROUTES: Dict[int, Worker] = {z: w for w in GROUPS for z in w.zones}
+
+async def supervise():
+    '''Respawn workers that died; their journals restore any unflushed writes.'''
+    while True:
+        await asyncio.sleep(1.0)
+        for w in GROUPS:
+            if w.process.poll() is not None:
+                Tee.log(f"[router] {w.name} exited with code {w.process.returncode}, restarting")
+                w.restarts += 1
+                w.spawn(caching.CACHE_MEMORY_BYTES // len(GROUPS))
+                try:
+                    await w.ready()
+                except RuntimeError as e:
+                    Tee.exception(e, f"[router] {w.name} failed to restart")
+
+@asynccontextmanager
+async def lifespan(router: FastAPI):
+    SOCKET_DIR.mkdir(parents=True, exist_ok=True)
+    # The process-wide cache cap is split evenly between the workers
+    for w in GROUPS:
+        w.spawn(caching.CACHE_MEMORY_BYTES // len(GROUPS))
+    await asyncio.gather(*[w.ready() for w in GROUPS])
+    supervisor = asyncio.create_task(supervise())
+    yield
+    supervisor.cancel()
+    for w in GROUPS:
+        await asyncio.to_thread(w.stop)
+        await w.client.aclose()
+
+router = FastAPI(title='Database Router', version=versioning.distribution_version, lifespan=lifespan)
+router.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"]
+)
+
+# Forwarding ───────────────────────────
+
+FORWARD_HEADERS = ("x-api-key", "content-type", "accept", "if-none-match")
+
+def worker_for(zone: Any) -> Worker:
+    try:
+        return ROUTES[int(zone)]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid zone ID: {zone}")
+
+async def forward(worker: Worker, request: Request, body: bytes | None = None) -> Response:
+    try:
+        response = await worker.client.request(
+            request.method,
+            request.url.path,
+            params=request.query_params,
+            headers={k: v for k, v in request.headers.items() if k.lower() in FORWARD_HEADERS},
+            content=await request.body() if body is None else body,
+            timeout=route_timeout(request)
+        )
+    except httpx.TransportError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Zone worker {worker.name} unavailable")
+
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        headers={k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "transfer-encoding", "connection")}
+    )
+
+async def forward_stream(worker: Worker, request: Request) -> StreamingResponse:
+    '''Like `forward`, but relays the body as it arrives (exports, timelines).'''
+    upstream = worker.client.build_request(
+        request.method,
+        request.url.path,
+        params=request.query_params,
+        headers={k: v for k, v in request.headers.items() if k.lower() in FORWARD_HEADERS},
+        content=await request.body(),
+        timeout=route_timeout(request)
+    )
+    try:
+        response = await worker.client.send(upstream, stream=True)
+    except httpx.TransportError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Zone worker {worker.name} unavailable")
+
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type"),
+        background=BackgroundTask(response.aclose)
+    )
+
+async def json_body(request: Request) -> dict:
+    try:
+        return json.loads(await request.body())
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid JSON body")
+
+# Routes ───────────────────────────
+
+@router.get("/hello")
+async def hello(request: Request):
+    return await forward(GROUPS[0], request)
+
+@router.get("/health")
+async def health(request: Request):
+    """Merged metrics of every worker, plus router-level worker status."""
+    responses = await asyncio.gather(*[forward(w, request) for w in GROUPS])
+    merged: Dict[str, Any] = {"message": "OK", "cache_budget": {}, "flush": {}, "backups": {}, "workers": {}}
+    for w, response in zip(GROUPS, responses):
+        merged["workers"][w.name] = {"pid": w.process.pid, "zones": w.zones, "restarts": w.restarts}
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        body = json.loads(response.body)
+        merged["cache_budget"][w.name] = body.pop("cache_budget", None)
+        merged["flush"][w.name] = body.pop("flush", None)
+        merged["backups"][w.name] = body.pop("backups", None)
+        merged.update({k: v for k, v in body.items() if k != "message"})
+    return merged
+
+@router.post("/expandall")
+@router.post("/expand")
+async def by_location(request: Request):
+    body = await request.body()
+    return await forward(worker_for((await json_body(request)).get("z")), request, body)
+
+@router.post("/expandmany")
+async def by_locations(request: Request):
+    """Split the points by worker and stitch the answers back in request order."""
+    payload = await json_body(request)
+    points = payload.get("points") or []
+    if not isinstance(points, list) or len(points) > MAX_POINTS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"points must be a list of at most {MAX_POINTS}")
+
+    by_worker: Dict[str, List[int]] = {}
+    for n, point in enumerate(points):
+        by_worker.setdefault(worker_for(point.get("z") if isinstance(point, dict) else None).name, []).append(n)
+
+    workers = {w.name: w for w in GROUPS}
+    names = list(by_worker)
+    responses = await asyncio.gather(*[
+        forward(workers[name], request, json.dumps({"points": [points[n] for n in by_worker[name]]}).encode())
+        for name in names
+    ])
+
+    entities: List[Any] = [None] * len(points)
+    for name, response in zip(names, responses):
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        for n, ent in zip(by_worker[name], json.loads(response.body)["entities"]):
+            entities[n] = ent
+    return {"entities": entities}
+
+@router.post("/search")
+async def search(request: Request):
+    """Ask each worker for its best `offset + limit` hits and merge them by score."""
+    payload = await json_body(request)
+    zones = payload.get("zones")
+    limit, offset = payload.get("limit", 20), payload.get("offset", 0)
+    if not isinstance(limit, int) or not isinstance(offset, int) or limit < 1 or offset < 0 or offset + limit > databases.SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"offset + limit must not exceed {databases.SEARCH_MAX_RESULTS}")
+
+    by_worker: Dict[str, List[Any]] = {}
+    for z in zones if isinstance(zones, list) else [z for w in GROUPS for z in w.zones]:
+        by_worker.setdefault(worker_for(z).name, []).append(z)
+
+    workers = {w.name: w for w in GROUPS}
+    responses = await asyncio.gather(*[
+        forward(workers[name], request, json.dumps({**payload, "zones": zs, "limit": offset + limit, "offset": 0}).encode())
+        for name, zs in by_worker.items()
+    ])
+
+    found = []
+    for response in responses:
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        found.append(json.loads(response.body)["results"])
+    return {"results": databases.merge_search_hits(found, limit, offset)}
+
+@router.post("/owner_totals")
+async def owner_totals(request: Request):
+    """Sum one owner's per-zone stack counts over the workers."""
+    payload = await json_body(request)
+    zones = payload.get("zones")
+
+    by_worker: Dict[str, List[Any]] = {}
+    for z in zones if isinstance(zones, list) else [z for w in GROUPS for z in w.zones]:
+        by_worker.setdefault(worker_for(z).name, []).append(z)
+
+    workers = {w.name: w for w in GROUPS}
+    responses = await asyncio.gather(*[
+        forward(workers[name], request, json.dumps({**payload, "zones": zs}).encode())
+        for name, zs in by_worker.items()
+    ])
+
+    per_zone: Dict[str, int] = {}
+    for response in responses:
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        per_zone.update(json.loads(response.body)["zones"])
+    per_zone = dict(sorted(per_zone.items(), key=lambda kv: int(kv[0])))
+    return {"ownership": payload.get("ownership"), "zones": per_zone, "total": sum(per_zone.values())}
+
+@router.get("/export/{zone}")
+@router.post("/timeline/{zone}")
+async def stream_zone(request: Request, zone: str):
+    return await forward_stream(worker_for(zone), request)
+
+@router.api_route("/{route}/{zone}", methods=["GET", "POST"])
+@router.api_route("/{route}/{zone}/{rest:path}", methods=["GET", "POST"])
+async def by_zone(request: Request, route: str, zone: str):
+    """/set, /get, /range, /ownership, /search, /get_max_index, /stats, /backup and /health by zone."""
+    return await forward(worker_for(zone), request)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(router, host="0.0.0.0", port=9401, workers=1, loop="asyncio")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 # internal
-from engine import jsonsafe, verbose, versioning, security, validation, databases
+from engine import jsonsafe, verbose, versioning, security, validation, databases, caching, backups, flushing
 
 import sqlite3
 import asyncio
@@ -24,7 +24,7 @@ import pandas as pd
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi                 import FastAPI, Header, HTTPException, status, BackgroundTasks, Depends
 from fastapi.security        import APIKeyHeader
-from fastapi.responses       import PlainTextResponse # might be removed later
+from fastapi.responses       import PlainTextResponse, StreamingResponse # PlainText might be removed later
 from uvicorn                 import run as uvicorn_run
 from pydantic                import BaseModel, Field
 
@@ -41,17 +41,34 @@ Tee = verbose.T()
 ExtendToParentResource = lambda *args: Path(os.path.join(Path(__file__).parent.resolve(), *args))
 NewID = lambda: str(uuid.uuid4())
 
+# Zones served by this process (comma separated, default: all). `db_router.py`
+# starts one worker per zone group with DB_ZONES set and DB_UDS pointing at
+# the unix socket it should listen on.
+DB_ZONES = [int(z) for z in os.getenv("DB_ZONES", ",".join(map(str, databases.ZONE_INTEGERS))).split(",") if z.strip()]
+DB_UDS   = os.getenv("DB_UDS", "")
+
+# Zones are opened on first use. Hot zones (comma separated) are opened in the
+# background right after startup and keep their connections while idle; zones
+# with unflushed journal writes are opened the same way.
+DB_HOT_ZONES = [int(z) for z in os.getenv("DB_HOT_ZONES", "").split(",") if z.strip()]
+
 # NOTE : Each "zone" will have a default aesthetic map with deterministic randomness.
 ZONES = {
     i : databases.EntityStore(
-        ExtendToParentResource('db', f'zone{i}.sqlite'), databases.POOL_SIZE) 
-        for i in databases.ZONE_INTEGERS
+        ExtendToParentResource('db', f'zone{i}.sqlite'), databases.POOL_SIZE, zone=i)
+        for i in databases.ZONE_INTEGERS if i in DB_ZONES
 }
 
 db_path = ExtendToParentResource('db')
 if not db_path.exists():
     db_path.mkdir(parents=True, exist_ok=True)
 
+# One flush/checkpoint schedule for every zone served here
+FLUSHER = flushing.FlushScheduler(ZONES)
+
+# Online zone backups (BACKUP_INTERVAL > 0 enables the schedule)
+BACKUPS = backups.BackupScheduler(ZONES, Path(os.getenv("BACKUP_DIR", ExtendToParentResource('db', 'backups'))))
+
 key_storage_file = ExtendToParentResource('engine', 'key.json')  # Where the private decryption key is stored
 
 class HelloResponse(BaseModel):
@@ -80,25 +97,83 @@ class OwnershipCursorQuery(BaseModel):
     after_index: int | None = None
     include_totals: bool = False
 
+class OwnerTotalsQuery(BaseModel):
+    ownership: str
+    zones: List[int] | None = None  # None = every zone served here
+
 class RangeQuery(BaseModel):
     min_x: int
     max_x: int
     min_y: int
     max_y: int
     limit: int = 1000
+    as_of: float | None = None  # timestamp; newest version at or before it
+
+class OverviewQuery(BaseModel):
+    min_x: int
+    max_x: int
+    min_y: int
+    max_y: int
+    grid: int = Field(64, ge=1, le=256)  # max blocks per viewport side
+
+class TileVersionQuery(BaseModel):
+    tiles: list[tuple[int, int]] = Field(..., min_length=1, max_length=1024)  # (tile_x, tile_y)
+
+class TileChangesQuery(BaseModel):
+    tile_x: int
+    tile_y: int
+    since: str = Field(..., max_length=64)  # a version from /tile_version
+
+class TimelineQuery(BaseModel):
+    min_x: int
+    max_x: int
+    min_y: int
+    max_y: int
+    since: float | None = None
+    until: float | None = None
+
+class SearchQuery(BaseModel):
+    query: str = Field(..., min_length=databases.SEARCH_MIN_CHARS, max_length=256)
+    zones: List[int] | None = None  # /search only; None = every zone served here
+    limit: int = Field(20, ge=1, le=databases.SEARCH_MAX_RESULTS)
+    offset: int = Field(0, ge=0, le=databases.SEARCH_MAX_RESULTS)
 
 class DBEntityRequest(BaseModel):
     x: int
     y: int
     z: int
     i: int
+    as_of: float | None = None
+
+class DBPoint(BaseModel):
+    x: int
+    y: int
+    z: int
+
+class DBPointsRequest(BaseModel):
+    points: List[DBPoint] = Field(..., max_length=databases.EXPAND_MANY_MAX)
 
 @asynccontextmanager
 async def lifespan(server: FastAPI):
     global ZONES
-    for store in ZONES.values():
-        await store.init()
+    def pending(store: databases.EntityStore) -> bool:
+        return databases.WriteJournal(store.path.with_suffix('.journal')).has_pending()
+
+    warm = [store for z, store in ZONES.items() if z in DB_HOT_ZONES or pending(store)]
+    for z in DB_HOT_ZONES:
+        if z in ZONES:
+            ZONES[z].keep_open = True
+
+    # Serve right away; requests for a warming zone wait for its init
+    warmup = asyncio.ensure_future(asyncio.gather(*[store.open() for store in warm], return_exceptions=True))
+    FLUSHER.start()
+    BACKUPS.start()
     yield
+    await BACKUPS.stop()
+    await FLUSHER.stop()
+    for store, result in zip(warm, await warmup):
+        if isinstance(result, Exception):
+            Tee.log(f"Warm-up of {store.name} failed: {result}")
     for store in ZONES.values():
         await store.close()
 
@@ -112,8 +187,8 @@ server.add_middleware(
     allow_headers=["*"]
 )
 
-def ThrowHTTPError(message, status_code=status.HTTP_401_UNAUTHORIZED):
-    e = HTTPException(status_code=status_code, detail=message)
+def ThrowHTTPError(message, status_code=status.HTTP_401_UNAUTHORIZED, headers=None):
+    e = HTTPException(status_code=status_code, detail=message, headers=headers)
     Tee.exception(e, msg=message)
     raise e
 
@@ -148,14 +223,8 @@ async def get_max_index(zone: int):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
     
     store = ZONES[zone]
-    # Query database for max index in this zone
-    async with store._conn() as conn:
-        cursor = await anyio.to_thread.run_sync(
-            conn.execute,
-            'SELECT MAX("index") FROM entities'
-        )
-        row = cursor.fetchone()
-        max_index = row[0] if row and row[0] is not None else 0
+    await store.open()
+    max_index = await store.max_index()
     
     return {"max_index": max_index}
 
@@ -165,9 +234,117 @@ async def get_entities_by_ownership(zone: int, query: OwnershipCursorQuery):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[zone]
+    await store.open()
 
     return await store.get_by_ownership_cursor(**query.model_dump())
 
+@server.post("/overview/{zone}", dependencies=[Depends(Authorization)])
+async def get_overview(zone: int, query: OverviewQuery):
+    """
+    Zoomed-out view: claimed/minted counts, dominant owner and latest write
+    per block, at the finest pyramid level that fits the viewport in `grid`
+    blocks per side.
+    """
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    await store.open()
+
+    return await store.overview(query.model_dump(exclude={"grid"}), query.grid)
+
+@server.post("/tile_version/{zone}", dependencies=[Depends(Authorization)])
+async def get_tile_versions(zone: int, query: TileVersionQuery):
+    """
+    Current render version of each 8x8 tile (see `EntityStore.tile_version`),
+    for callers that cache rendered tiles. Versions live in memory, so this
+    does not open the zone.
+    """
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    return {'versions': [store.tile_version(tx, ty) for tx, ty in query.tiles]}
+
+@server.post("/tile_changes/{zone}", dependencies=[Depends(Authorization)])
+async def get_tile_changes(zone: int, query: TileChangesQuery):
+    """
+    Cells of one tile changed after version `since`, and the tile's current
+    version. `cells` is null when `since` predates a restart (send the whole
+    tile). In memory; does not open the zone.
+    """
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    version, cells = ZONES[zone].tile_changes(query.tile_x, query.tile_y, query.since)
+    return {'version': version, 'cells': cells}
+
+@server.post("/search/{zone}", dependencies=[Depends(Authorization)])
+async def search_zone(zone: int, query: SearchQuery):
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    await store.open()
+
+    return {"results": await store.search(query.query, query.limit, query.offset)}
+
+@server.post("/search", dependencies=[Depends(Authorization)])
+async def search_zones(query: SearchQuery):
+    """
+    Ranked text search over several zones (all by default). Every zone
+    returns its best `offset + limit` hits; they are merged by score.
+    """
+    global ZONES
+    ThrowIf(query.offset + query.limit > databases.SEARCH_MAX_RESULTS,
+            f"offset + limit must not exceed {databases.SEARCH_MAX_RESULTS}", status.HTTP_400_BAD_REQUEST)
+    zones = query.zones if query.zones is not None else list(ZONES)
+    for z in zones:
+        ThrowIf(z not in ZONES, f"Invalid zone ID: {z}", status.HTTP_400_BAD_REQUEST)
+
+    await asyncio.gather(*[ZONES[z].open() for z in zones])
+    found = await asyncio.gather(*[
+        ZONES[z].search(query.query, query.offset + query.limit) for z in zones
+    ])
+    return {"results": databases.merge_search_hits(found, query.limit, query.offset)}
+
+@server.post("/owner_totals", dependencies=[Depends(Authorization)])
+async def get_owner_totals(query: OwnerTotalsQuery):
+    """Stacks held by one owner in each zone and in total (one lookup per zone)."""
+    global ZONES
+    zones = query.zones if query.zones is not None else list(ZONES)
+    for z in zones:
+        ThrowIf(z not in ZONES, f"Invalid zone ID: {z}", status.HTTP_400_BAD_REQUEST)
+
+    await asyncio.gather(*[ZONES[z].open() for z in zones])
+    counts = await asyncio.gather(*[ZONES[z].owner_total(query.ownership) for z in zones])
+    per_zone = {str(z): n for z, n in zip(zones, counts)}
+    return {"ownership": query.ownership, "zones": per_zone, "total": sum(counts)}
+
+@server.get("/export/{zone}", dependencies=[Depends(Authorization)])
+async def export_zone(
+        zone: int,
+        after_index: int | None = None,
+        ownership: str | None = None,
+        include_pending: bool = False
+    ):
+    """
+    Stream a zone as NDJSON (one entity version per line) in index order.
+    With `ownership`, stream the latest row of each stack owned by it instead.
+    Resume an interrupted export with the last fully received `after_index`.
+    """
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    await store.open()
+
+    async def ndjson():
+        async for rows in store.export(after_index, ownership, include_pending):
+            yield "".join(json.dumps(r, separators=(",", ":"), default=dict) + "\n" for r in rows)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @server.post("/set/{zone}", dependencies=[Depends(Authorization)])
 async def set_entity(zone: int, entity: EntityIn):
     """Upsert an entity version into a specific zone."""
@@ -175,34 +352,24 @@ async def set_entity(zone: int, entity: EntityIn):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
     
     store = ZONES[zone]
+    await store.open()
     entity_dict = entity.model_dump()
     
     Tee.log(f"[/set/{zone}] Received entity: {entity_dict}")
     
-    # Auto-generate index if not provided
-    if entity_dict['index'] is None:
-        # Allocate a unique index atomically using the per-zone sequence table.
-        async with store._conn() as conn:
-            # Insert a row into index_seq to get an autoincremented id
-            cursor = await anyio.to_thread.run_sync(
-                conn.execute,
-                "INSERT INTO index_seq DEFAULT VALUES"
-            )
-            # sqlite3 Cursor has lastrowid attribute containing the new id
-            new_index = cursor.lastrowid if hasattr(cursor, 'lastrowid') else None
-            if new_index is None:
-                # Fallback to MAX+1 if sequence insertion failed
-                cursor2 = await anyio.to_thread.run_sync(
-                    conn.execute,
-                    'SELECT MAX("index") FROM entities'
-                )
-                row = cursor2.fetchone()
-                max_index = row[0] if row and row[0] is not None else 0
-                new_index = max_index + 1
-            entity_dict['index'] = int(new_index)
-        Tee.log(f"[/set/{zone}] Auto-generated index (seq): {entity_dict['index']}")
-    
-    await store.set(entity_dict)
+    try:
+        # Refuse early (before reserving an index) when the zone is backed up
+        store.admit()
+
+        # Auto-generate index if not provided
+        if entity_dict['index'] is None:
+            # Allocate a unique index atomically on the zone's writer thread.
+            entity_dict['index'] = await store.allocate_index()
+            Tee.log(f"[/set/{zone}] Auto-generated index (seq): {entity_dict['index']}")
+
+        await store.set(entity_dict)
+    except databases.WriteRejected as e:
+        ThrowHTTPError(e.detail, e.status_code, headers={"Retry-After": str(e.retry_after)})
     
     # Fetch and return the full entity stack for this index
     all_iterations = await store.get_iters_of_one(
@@ -230,6 +397,7 @@ async def get_latest_entity(zone: int, index: int):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[zone]
+    await store.open()
     ent = await store.get(index)
     if not ent:
         raise HTTPException(status_code=404, detail="Entity not found")
@@ -241,12 +409,40 @@ async def get_all_at_location(payload: DBEntityRequest):
     ThrowIf(payload.z not in ZONES, f"Invalid zone ID: {payload.z}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[payload.z]
+    await store.open()
 
     return await store.get_iters_of_one(
         payload.x, 
-        payload.y
+        payload.y,
+        as_of=payload.as_of
     )
 
+@server.post("/expandmany", dependencies=[Depends(Authorization)])
+async def get_many_locations(payload: DBPointsRequest):
+    """
+    Latest entity (top of stack) for each (x, y, z) point, in request order.
+    `null` marks a cell with no entity. One query per zone, zones in parallel.
+    """
+    global ZONES
+    by_zone: Dict[int, List[int]] = {}
+    for n, point in enumerate(payload.points):
+        ThrowIf(point.z not in ZONES, f"Invalid zone ID: {point.z}", status.HTTP_400_BAD_REQUEST)
+        by_zone.setdefault(point.z, []).append(n)
+
+    zones = list(by_zone)
+    await asyncio.gather(*[ZONES[z].open() for z in zones])
+    found = await asyncio.gather(*[
+        ZONES[z].latest_at_many([(payload.points[n].x, payload.points[n].y) for n in by_zone[z]])
+        for z in zones
+    ])
+
+    entities: List[dict | None] = [None] * len(payload.points)
+    for z, cells in zip(zones, found):
+        for n in by_zone[z]:
+            entities[n] = cells.get((payload.points[n].x, payload.points[n].y))
+
+    return {"entities": entities}
+
 # This is more useful for time-based requests.
 @server.post("/expand", dependencies=[Depends(Authorization)])
 async def get_specific_location(payload: DBEntityRequest):
@@ -254,14 +450,16 @@ async def get_specific_location(payload: DBEntityRequest):
     ThrowIf(payload.z not in ZONES, f"Invalid zone ID: {payload.z}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[payload.z]
+    await store.open()
 
     return await store.get_iters_of_one(
         payload.x, 
         payload.y, 
-        payload.i#+1 
+        payload.i,#+1 
         # NOTE : If iter is lower (0) -> max is 0,
         # should have another db function: Is latest iter? bool.
         # This may change in the future, due to this note.
+        as_of=payload.as_of
     )
 
 @server.get("/get/{zone}/{index}/{iter}", dependencies=[Depends(Authorization)])
@@ -271,6 +469,7 @@ async def get_specific_version(zone: int, index: int, iter: int):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[zone]
+    await store.open()
     ent = await store.get(index, iter)
     if not ent:
         raise HTTPException(status_code=404, detail=f"Entity version {index}v{iter} not found")
@@ -283,8 +482,47 @@ async def query_range(zone: int, query: RangeQuery):
     ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
 
     store = ZONES[zone]
+    await store.open()
     return await store.range_query(query.model_dump())
 
+@server.get("/stats/{zone}", dependencies=[Depends(Authorization)])
+async def zone_stats(zone: int):
+    """Counts and bounds over the latest iteration of every entity in a zone."""
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    await store.open()
+    return await store.stats()
+
+@server.post("/backup/{zone}", dependencies=[Depends(Authorization)])
+async def backup_zone(zone: int):
+    """Take an online backup of a zone now; returns the archive name."""
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        archive = await BACKUPS.run(zone)
+    except Exception as e:
+        ThrowHTTPError(f"Backup failed: {e}", status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return {"archive": archive.name, **BACKUPS.status[zone]}
+
+@server.post("/timeline/{zone}", dependencies=[Depends(Authorization)])
+async def stream_timeline(zone: int, query: TimelineQuery):
+    """Replay every persisted version inside the bounds in timestamp order, as NDJSON."""
+    global ZONES
+    ThrowIf(zone not in ZONES, f"Invalid zone ID: {zone}", status.HTTP_400_BAD_REQUEST)
+
+    store = ZONES[zone]
+    await store.open()
+    bounds = query.model_dump(exclude={'since', 'until'})
+
+    async def ndjson():
+        async for rows in store.timeline(bounds, query.since, query.until):
+            yield "".join(json.dumps(r, separators=(",", ":"), default=dict) + "\n" for r in rows)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 # Health and Auth Routes ───────────────────────────
 
 @server.get("/hello", response_model=HelloResponse)
@@ -300,7 +538,14 @@ async def health():
     """Get metrics for all zones."""
     global ZONES
     metrics = {i : store.metrics for i, store in ZONES.items()}
-    return { "message": "OK", **metrics, "db_server_version": versioning.distribution_version }
+    return {
+        "message": "OK",
+        **metrics,
+        "cache_budget": caching.CACHE_BUDGET.metrics,
+        "flush": FLUSHER.metrics,
+        "backups": BACKUPS.metrics,
+        "db_server_version": versioning.distribution_version
+    }
 
 @server.get("/health/{zone}", dependencies=[Depends(Authorization)])
 async def zone_health(zone: int):
@@ -314,4 +559,7 @@ async def zone_health(zone: int):
 if __name__ == "__main__":
     import uvicorn
     # Use loop="asyncio" to prevent uvloop conflicts with generic thread pools if needed
-    uvicorn.run(server, host="0.0.0.0", port=9401, workers=1, loop="asyncio")
\ No newline at end of file
+    if DB_UDS:
+        uvicorn.run(server, uds=DB_UDS, workers=1, loop="asyncio")
+    else:
+        uvicorn.run(server, host="0.0.0.0", port=9401, workers=1, loop="asyncio")
\ No newline at end of file
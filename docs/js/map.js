@@ -176,15 +176,50 @@ function populateGrid(entityRows) {
 
 // Factory Functions
 
+// Tiles seen this session are kept with their ETag and version: fe_server answers 304 while
+// they are unchanged, and otherwise only the cells changed since that version (merged here)
 function RenderFactory(url, x, y, z, apikey=null) {
+    const key = `render:${url}:${x}:${y}:${z}`;
+    let cached = null;
+    try {
+        cached = JSON.parse(sessionStorage.getItem(key));
+    } catch (e) {}
+
+    const headers = apikey ? { "X-API-Key": apikey } : {};
+    if (cached && cached.etag) headers["If-None-Match"] = cached.etag;
+
     return $.ajax({
         type: "POST",
         url: url,
         timeout: 1500,
         contentType: "application/json",
         dataType: "json",
-        headers: apikey ? { "X-API-Key": apikey } : {},
-        data: JSON.stringify({ 'x_axis': x, 'y_axis': y, 'z_axis': z, 'time_axis': null })
+        headers: headers,
+        data: JSON.stringify({
+            'x_axis': x, 'y_axis': y, 'z_axis': z, 'time_axis': null,
+            'since': cached && cached.body.version ? cached.body.version : null
+        })
+    }).then(function (res, textStatus, jqXHR) {
+        if (jqXHR.status === 304 && cached) return cached.body;
+
+        if (res && res.delta && cached) {
+            const body = cached.body;
+            for (const ent of res.cells) {
+                body.entities[ent.positionY - body.y[0]][ent.positionX - body.x[0]] = ent;
+            }
+            body.version = res.version;
+            body.user_context = res.user_context;
+            body.banner = res.banner;
+            res = body;
+        }
+
+        const etag = jqXHR.getResponseHeader("ETag");
+        if (etag && res && res.message === "OK") {
+            try {
+                sessionStorage.setItem(key, JSON.stringify({ etag: etag, body: res }));
+            } catch (e) {} // storage full: just don't cache
+        }
+        return res;
     })
 }
 
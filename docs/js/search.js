@@ -24,6 +24,30 @@ function QueryOwnershipData(url, ownership_id, z, after_index=null) {
     })
 }
 
+/**
+ * Search entity names and descriptions (at least 3 characters).
+ * Results are ranked best first; pass the returned next_offset to page.
+ * zones=null searches every zone.
+ */
+function QueryTextSearch(url, query, zones=null, offset=0, limit=20) {
+
+    const payload = {
+        query: query,
+        offset: offset,
+        limit: limit,
+        ...(zones !== null && { zones })
+    };
+
+    return $.ajax({
+        type: "POST",
+        url: url,
+        timeout: 5000,
+        contentType: "application/json",
+        dataType: "json",
+        data: JSON.stringify(payload)
+    })
+}
+
 function ChangeUserNav(res) {
     nav = document.getElementById('user-login-nav');
     if (res.user_context.decryption_success) {
@@ -0,0 +1,116 @@
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Iterator
+
+from .zonetables import ZONE_COLORS, ZONE_GLYPHS
+
+# Packed layout (17 bytes): format tag, then 8 indices into ZONE_COLORS[z]
+# (channel_0..7) and 8 indices into ZONE_GLYPHS[z] (glyph_0..7).
+PACKED_FORMAT = 1
+CHANNELS      = 8
+GLYPHS        = 8
+
+@lru_cache(maxsize=None)
+def _palette_positions(z: int) -> tuple[dict[str, int], dict[str, int]]:
+    # Palettes may repeat a value; any position decodes to the same string
+    colors, glyphs = {}, {}
+    for i, c in enumerate(ZONE_COLORS[z]):
+        colors.setdefault(c, i)
+    for i, g in enumerate(ZONE_GLYPHS[z]):
+        glyphs.setdefault(g, i)
+    return colors, glyphs
+
+def pack(aesthetics: Any, z: int | None) -> bytes | None:
+    '''
+    Pack a palette-only aesthetics dict (or its JSON text) into a small BLOB.
+    Returns `None` when it cannot be represented, e.g. custom values or keys.
+    '''
+    if z not in ZONE_COLORS:
+        return None
+    if isinstance(aesthetics, str):
+        try:
+            aesthetics = json.loads(aesthetics)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(aesthetics, Mapping) or len(aesthetics) != 2:
+        return None
+
+    bar, glyphs = aesthetics.get('bar'), aesthetics.get('glyphs')
+    if not isinstance(bar, Mapping) or not isinstance(glyphs, Mapping) or len(bar) != CHANNELS or len(glyphs) != GLYPHS:
+        return None
+
+    colors, glyph_positions = _palette_positions(z)
+    try:
+        return bytes([
+            PACKED_FORMAT,
+            *(colors[bar[f'channel_{i}']] for i in range(CHANNELS)),
+            *(glyph_positions[glyphs[f'glyph_{i}']] for i in range(GLYPHS))
+        ])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def encode(aesthetics: Any, z: int | None) -> bytes | str | None:
+    '''Storage value for the `aesthetics` column: packed BLOB, else JSON text.'''
+    if aesthetics is None:
+        return None
+    packed = pack(aesthetics, z)
+    if packed is not None:
+        return packed
+    return aesthetics if isinstance(aesthetics, str) else json.dumps(aesthetics, default=dict)
+
+@lru_cache(maxsize=4096)
+def _unpack(blob: bytes, z: int) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    colors, glyphs = ZONE_COLORS[z], ZONE_GLYPHS[z]
+    return (
+        tuple(colors[i] for i in blob[1:1 + CHANNELS]),
+        tuple(glyphs[i] for i in blob[1 + CHANNELS:1 + CHANNELS + GLYPHS])
+    )
+
+def decode(value: bytes | str | None, z: int | None) -> dict:
+    '''Column value back to the `{'bar': ..., 'glyphs': ...}` dict served by the API.'''
+    if isinstance(value, bytes):
+        if not value or value[0] != PACKED_FORMAT or z not in ZONE_COLORS:
+            return {}
+        colors, glyphs = _unpack(value, z)
+        return {
+            'bar': {f'channel_{i}': c for i, c in enumerate(colors)},
+            'glyphs': {f'glyph_{i}': g for i, g in enumerate(glyphs)}
+        }
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return {}
+
+class LazyAesthetics(Mapping):
+    '''
+    Read-only ``decode(value, z)``, decoded on first access. Rows built from
+    the column keep the stored value until a response (or a caller) reads
+    the strings. It serializes like a dict through FastAPI; pass
+    ``default=dict`` to ``json.dumps``.
+    '''
+    __slots__ = ('_value', '_z', '_decoded')
+
+    def __init__(self, value: bytes | str | None, z: int | None):
+        self._value = value
+        self._z = z
+        self._decoded: dict | None = None
+
+    def _dict(self) -> dict:
+        if self._decoded is None:
+            self._decoded = decode(self._value, self._z)
+        return self._decoded
+
+    def __getitem__(self, key: str) -> Any:
+        return self._dict()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._dict())
+
+    def __len__(self) -> int:
+        return len(self._dict())
+
+    def __repr__(self) -> str:
+        return repr(self._dict())
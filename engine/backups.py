@@ -0,0 +1,212 @@
+import os
+import gzip
+import shutil
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import anyio
+
+from .overlay import WriteJournal
+
+logger = logging.getLogger("db")
+
+BACKUP_INTERVAL    = float(os.getenv("BACKUP_INTERVAL", 0))      # seconds between backups of a zone, 0 = off
+BACKUP_PAGES       = int(os.getenv("BACKUP_PAGES", 256))         # pages copied per backup step
+BACKUP_SLEEP       = float(os.getenv("BACKUP_SLEEP", 0.005))     # seconds between steps
+BACKUP_KEEP        = int(os.getenv("BACKUP_KEEP", 7))            # archives kept per zone
+BACKUP_CONCURRENCY = int(os.getenv("BACKUP_CONCURRENCY", 1))     # zones copied at the same time
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def archive_name(source: Path, when: datetime) -> str:
+    # Microseconds, so a manual backup and a scheduled one in the same second don't collide
+    return f"{source.stem}-{when.strftime('%Y%m%dT%H%M%S.%fZ')}.sqlite.gz"
+
+def snapshot(
+        source: Path,
+        dest_dir: Path,
+        pages: int = BACKUP_PAGES,
+        sleep: float = BACKUP_SLEEP,
+        progress=None
+    ) -> Path:
+    '''
+    Online backup of one zone file into ``dest_dir`` (blocking; run in a thread).
+
+    A dedicated connection holds one read transaction for the whole copy, so
+    the backup reads a single WAL snapshot: writers keep committing and the
+    copy is never restarted by them. Pages are copied ``pages`` at a time
+    with a ``sleep`` in between, then gzip-compressed next to a
+    ``sha256sum``-compatible ``.sha256`` sidecar. Returns the archive path.
+    '''
+    if not source.exists():  # zone never written to; don't create an empty file
+        raise FileNotFoundError(source)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    archive = dest_dir / archive_name(source, datetime.now(timezone.utc))
+    raw = archive.with_name(f".{archive.name}.raw")
+    partial = archive.with_name(f".{archive.name}.part")
+
+    src = sqlite3.connect(source, isolation_level=None)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # pin the read snapshot
+        dst = sqlite3.connect(raw)
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        finally:
+            dst.close()
+        src.execute("COMMIT")
+    finally:
+        src.close()
+
+    try:
+        with raw.open("rb") as f_in, gzip.open(partial, "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+        os.replace(partial, archive)
+        archive.with_name(archive.name + ".sha256").write_text(f"{_sha256(archive)}  {archive.name}\n")
+    finally:
+        raw.unlink(missing_ok=True)
+        partial.unlink(missing_ok=True)
+    return archive
+
+def verify(archive: Path) -> bool:
+    '''Check an archive against its ``.sha256`` sidecar.'''
+    sidecar = archive.with_name(archive.name + ".sha256")
+    if not sidecar.exists():
+        return False
+    return sidecar.read_text().split()[0] == _sha256(archive)
+
+def restore(archive: Path, target: Path) -> Path:
+    '''
+    Replace a zone file with an archive. The zone must not be open.
+
+    The archive is checksummed, decompressed and ``integrity_check``ed before
+    anything is touched. The current file, its ``-wal``/``-shm`` and its
+    pending-write journal files are moved aside to ``*.pre-restore``; the journal
+    holds writes newer than the backup and is not replayed. Returns the path
+    the previous zone file was moved to.
+    '''
+    if not verify(archive):
+        raise ValueError(f"{archive.name}: checksum mismatch or missing .sha256")
+
+    staged = target.with_name(f".{target.name}.restore")
+    with gzip.open(archive, "rb") as f_in, staged.open("wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+
+    conn = sqlite3.connect(staged)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        staged.unlink(missing_ok=True)
+        raise ValueError(f"{archive.name}: integrity_check failed: {result}")
+
+    aside = target.with_name(target.name + ".pre-restore")
+    for suffix in ("", "-wal", "-shm"):
+        current = target.with_name(target.name + suffix)
+        if current.exists():
+            os.replace(current, aside.with_name(aside.name + suffix))
+    for journal in WriteJournal(target.with_suffix(".journal")).files():
+        os.replace(journal, journal.with_name(journal.name + ".pre-restore"))
+
+    os.replace(staged, target)
+    return aside
+
+def prune(dest_dir: Path, source: Path, keep: int = BACKUP_KEEP):
+    archives = sorted(dest_dir.glob(f"{source.stem}-*.sqlite.gz"))
+    for old in archives[:-keep] if keep > 0 else []:
+        old.unlink(missing_ok=True)
+        old.with_name(old.name + ".sha256").unlink(missing_ok=True)
+
+class BackupScheduler:
+    '''
+    Backs up every zone every ``BACKUP_INTERVAL`` seconds (staggered across
+    the interval) and on demand through ``run``. At most
+    ``BACKUP_CONCURRENCY`` zones are copied at once, so a full pass never
+    competes with request traffic for more than that many threads.
+    '''
+    def __init__(self, zones: dict[int, Any], dest_dir: Path, interval: float = BACKUP_INTERVAL):
+        self.zones = zones
+        self.dest_dir = dest_dir
+        self.interval = interval
+        self._limit = asyncio.Semaphore(max(1, BACKUP_CONCURRENCY))
+        self._tasks: list[asyncio.Task] = []
+        self.status: dict[int, dict[str, Any]] = {
+            z: {'running': False, 'pages_done': 0, 'pages_total': 0, 'count': 0, 'failures': 0,
+                'last_archive': None, 'last_bytes': 0, 'last_seconds': 0.0, 'last_finished': None, 'last_error': None}
+            for z in zones
+        }
+
+    def start(self):
+        if self.interval <= 0 or self._tasks:
+            return
+        step = self.interval / max(1, len(self.zones))
+        for n, z in enumerate(self.zones):
+            self._tasks.append(asyncio.create_task(self._loop(z, delay=n * step)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+
+    async def _loop(self, zone: int, delay: float):
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await self.run(zone)
+            except Exception:
+                pass  # recorded in status, retried next interval
+            await asyncio.sleep(self.interval)
+
+    async def run(self, zone: int) -> Path:
+        '''Back up one zone now (waits for a free slot).'''
+        state = self.status[zone]
+        source = self.zones[zone].path
+
+        def progress(status, remaining, total):
+            state['pages_done'] = total - remaining
+            state['pages_total'] = total
+
+        async with self._limit:
+            state.update(running=True, pages_done=0, pages_total=0)
+            started = time.monotonic()
+            try:
+                archive = await anyio.to_thread.run_sync(snapshot, source, self.dest_dir, BACKUP_PAGES, BACKUP_SLEEP, progress)
+                await anyio.to_thread.run_sync(prune, self.dest_dir, source)
+            except Exception as e:
+                state.update(failures=state['failures'] + 1, last_error=str(e))
+                logger.error(f"Backup of {source.name} failed: {e}")
+                raise
+            finally:
+                state['running'] = False
+
+        state.update(
+            count=state['count'] + 1,
+            last_archive=archive.name,
+            last_bytes=archive.stat().st_size,
+            last_seconds=round(time.monotonic() - started, 3),
+            last_finished=datetime.now(timezone.utc).isoformat(),
+            last_error=None
+        )
+        logger.info(f"Backed up {source.name} to {archive.name} in {state['last_seconds']}s")
+        return archive
+
+    @property
+    def metrics(self) -> dict:
+        return {'interval': self.interval, 'dir': str(self.dest_dir), 'zones': self.status}
@@ -0,0 +1,211 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# Per-zone tier budgets (the version tier is sized by `databases.LRU_CACHE_SIZE`)
+VERSION_CACHE_BYTES   = int(os.getenv("VERSION_CACHE_BYTES", 4 * 1024 * 1024))
+STACK_CACHE_ENTRIES   = int(os.getenv("STACK_CACHE_ENTRIES", 2048))
+STACK_CACHE_BYTES     = int(os.getenv("STACK_CACHE_BYTES", 8 * 1024 * 1024))
+TILE_CACHE_ENTRIES    = int(os.getenv("TILE_CACHE_ENTRIES", 4096))
+TILE_CACHE_BYTES      = int(os.getenv("TILE_CACHE_BYTES", 32 * 1024 * 1024))
+
+# Shared by every tier of every zone in the process
+CACHE_MEMORY_BYTES    = int(os.getenv("CACHE_MEMORY_BYTES", 256 * 1024 * 1024))
+
+# Share of a tier's bytes reserved for entries that were hit at least twice
+PROTECTED_RATIO = 0.8
+
+# Rough in-memory footprint of one decoded entity row (dict + aesthetics)
+ROW_OVERHEAD = 1536
+
+def estimate_row_bytes(row: dict | tuple) -> int:
+    if isinstance(row, dict):
+        return ROW_OVERHEAD + len(row.get('name') or '') + len(row.get('description') or '')
+    # Raw `entities` tuple: name(4), description(5), aesthetics(8)
+    return ROW_OVERHEAD + sum(len(row[i] or '') for i in (4, 5, 8))
+
+def estimate_rows_bytes(rows) -> int:
+    return sum(estimate_row_bytes(r) for r in rows)
+
+class MemoryBudget:
+    '''
+    Process-wide byte cap shared by every `SegmentedLRU` registered with it.
+
+    Each tier enforces its own budget first; when the sum over all tiers
+    exceeds `limit`, the largest tiers give up their coldest entries until
+    the process is back under the cap.
+    '''
+    def __init__(self, limit: int = CACHE_MEMORY_BYTES):
+        self.limit = limit
+        self.used = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._caches: weakref.WeakSet = weakref.WeakSet()
+
+    def register(self, cache: "SegmentedLRU"):
+        self._caches.add(cache)
+
+    def charge(self, delta: int):
+        with self._lock:
+            self.used += delta
+
+    def reclaim(self):
+        while self.used > self.limit:
+            victim = max(self._caches, key=lambda c: c.bytes, default=None)
+            if victim is None or not victim.bytes:
+                return
+            victim._evict_one()
+            self.evictions += 1
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'used': self.used,
+            'caches': len(self._caches),
+            'evictions': self.evictions,
+        }
+
+CACHE_BUDGET = MemoryBudget()
+
+class SegmentedLRU:
+    '''
+    Byte- and entry-bounded segmented LRU (SLRU).
+
+    New entries land in a *probation* segment; a second hit promotes them to
+    the *protected* segment, which holds up to `PROTECTED_RATIO` of the
+    tier's bytes. Eviction always starts from the cold end of probation, so
+    one-off scans (e.g. walking an ownership page) cannot flush the hot set.
+
+    Writers call `invalidate` for keys they touch. Readers that fill the
+    cache from a slower source take a `token()` first and pass it to `put`;
+    if any invalidation happened in between, the result is not cached.
+    '''
+    def __init__(
+            self,
+            name: str,
+            max_entries: int,
+            max_bytes: int,
+            budget: MemoryBudget | None = CACHE_BUDGET
+        ):
+
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self._probation: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._protected: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._protected_bytes = 0
+        self._generation = 0
+
+        # Metrics
+        self.bytes         = 0
+        self.hits          = 0
+        self.misses        = 0
+        self.evictions     = 0
+        self.invalidations = 0
+
+        if budget is not None:
+            budget.register(self)
+
+    def __len__(self) -> int:
+        return len(self._probation) + len(self._protected)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._protected or key in self._probation
+
+    def token(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._protected.get(key)
+        if entry is not None:
+            self._protected.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        entry = self._probation.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # Second touch: promote, demoting the protected tail if it overflows
+        self._protected[key] = entry
+        self._protected_bytes += entry[1]
+        while self._protected_bytes > self.max_bytes * PROTECTED_RATIO and len(self._protected) > 1:
+            old_key, old = self._protected.popitem(last=False)
+            self._protected_bytes -= old[1]
+            self._probation[old_key] = old
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int, token: int | None = None):
+        if token is not None and token != self._generation:
+            return
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        protected = key in self._protected
+        self._drop(key)
+        segment = self._protected if protected else self._probation
+        segment[key] = (value, size)
+        if protected:
+            self._protected_bytes += size
+        self._account(size)
+
+        while len(self) > self.max_entries or self.bytes > self.max_bytes:
+            self._evict_one()
+            self.evictions += 1
+
+        if self.budget is not None:
+            self.budget.reclaim()
+
+    def invalidate(self, key: Hashable):
+        self._generation += 1
+        if self._drop(key):
+            self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._account(-self.bytes)
+        self._probation.clear()
+        self._protected.clear()
+        self._protected_bytes = 0
+
+    def _account(self, delta: int):
+        self.bytes += delta
+        if self.budget is not None:
+            self.budget.charge(delta)
+
+    def _drop(self, key: Hashable) -> bool:
+        entry = self._probation.pop(key, None)
+        if entry is None:
+            entry = self._protected.pop(key, None)
+            if entry is None:
+                return False
+            self._protected_bytes -= entry[1]
+        self._account(-entry[1])
+        return True
+
+    def _evict_one(self):
+        segment = self._probation if self._probation else self._protected
+        if not segment:
+            return
+        _, entry = segment.popitem(last=False)
+        if segment is self._protected:
+            self._protected_bytes -= entry[1]
+        self._account(-entry[1])
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self),
+            'protected': len(self._protected),
+            'bytes': self.bytes,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+# name -> dtype; one array per column, one slot per entity `index`
+COLUMNS = {
+    'index':     np.int64,
+    'iter':      np.int64,
+    'positionX': np.int64,
+    'positionY': np.int64,
+    'owner':     np.int32,    # position in `owners`, -1 for no owner
+    'uuid_hash': np.int64,    # 64-bit digest of the uuid, for distinct counts
+    'minted':    np.bool_,
+    'state':     np.int64,
+    'timestamp': np.float64,
+}
+
+# Slots appended since the last sort are scanned linearly; re-sort past this
+UNSORTED_TAIL = 4096
+
+def uuid_hash(value: str | None) -> int:
+    if value is None:
+        return 0
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little', signed=True)
+
+class LatestColumns:
+    '''
+    Latest iteration of every entity in a zone, as NumPy column arrays.
+
+    Mirrors ``entities_latest`` (one slot per ``index``) plus the ``state``,
+    ``minted`` and ``timestamp`` of that iteration. It is built once from the
+    zone file and then updated from committed flush batches, so it always
+    describes what is on disk. Ownership strings are interned into ``owners``.
+
+    ``export`` + ``write_snapshot`` store every column as
+    ``<dir>/<column>.npy`` plus ``meta.json``; other processes read them
+    without copying through ``load_snapshot``.
+    '''
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.owners: list[str] = []
+        self._owner_ids: dict[str, int] = {}
+        self._slots: dict[int, int] = {}
+        self._cols = {name: np.zeros(capacity, dtype) for name, dtype in COLUMNS.items()}
+        self.version = 0  # bumped on every change, recorded in snapshots
+
+        # Slots [0, _sorted_upto) ordered by positionX (positions never change)
+        self._by_x = np.zeros(0, np.int64)
+        self._x_sorted = np.zeros(0, np.int64)
+        self._sorted_upto = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def column(self, name: str) -> np.ndarray:
+        return self._cols[name][:self.size]
+
+    def _owner_id(self, owner: str | None) -> int:
+        if owner is None:
+            return -1
+        oid = self._owner_ids.get(owner)
+        if oid is None:
+            oid = self._owner_ids[owner] = len(self.owners)
+            self.owners.append(owner)
+        return oid
+
+    def _grow(self, needed: int):
+        capacity = len(self._cols['index'])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, arr in self._cols.items():
+            grown = np.zeros(capacity, arr.dtype)
+            grown[:self.size] = arr[:self.size]
+            self._cols[name] = grown
+
+    # Updates ───────────────────────────
+
+    def update(self, rows: Iterable[tuple]):
+        '''Apply ``entities`` rows; lower iterations of an index never replace higher ones.'''
+        for row in rows:
+            index, it = row[0], row[1]
+            slot = self._slots.get(index)
+            if slot is None:
+                self._grow(self.size + 1)
+                slot = self._slots[index] = self.size
+                self.size += 1
+            elif self._cols['iter'][slot] > it:
+                continue
+
+            c = self._cols
+            c['index'][slot]     = index
+            c['iter'][slot]      = it
+            c['uuid_hash'][slot] = uuid_hash(row[2])
+            c['state'][slot]     = row[3]
+            c['positionX'][slot] = row[6]
+            c['positionY'][slot] = row[7]
+            c['owner'][slot]     = self._owner_id(row[9])
+            c['minted'][slot]    = bool(row[10])
+            c['timestamp'][slot] = row[11] or 0.0
+        self.version += 1
+
+    @classmethod
+    def build(cls, conn: sqlite3.Connection) -> "LatestColumns":
+        '''Load from a zone file (run on a reader thread).'''
+        count = conn.execute("SELECT COUNT(*) FROM entities_latest").fetchone()[0]
+        columns = cls(capacity=max(1024, count))
+        cursor = conn.execute("""
+            SELECT e.*
+            FROM entities_latest l
+            CROSS JOIN entities e
+            ON e."index" = l."index"
+            AND e.iter = l.iter
+        """)
+        while batch := cursor.fetchmany(10_000):
+            columns.update(batch)
+        columns._sort()
+        return columns
+
+    def _sort(self):
+        x = self.column('positionX')
+        self._by_x = np.argsort(x, kind='stable')
+        self._x_sorted = x[self._by_x]
+        self._sorted_upto = self.size
+
+    # Queries ───────────────────────────
+
+    def range_keys(self, min_x: int, max_x: int, min_y: int, max_y: int, limit: int) -> list[tuple[int, int]]:
+        '''``(index, iter)`` of the latest rows inside the bounds (inclusive).'''
+        if self.size - self._sorted_upto > UNSORTED_TAIL:
+            self._sort()
+        x, y = self.column('positionX'), self.column('positionY')
+
+        # Binary search the x slab, then mask y within it; mask the unsorted tail
+        lo = np.searchsorted(self._x_sorted, min_x, 'left')
+        hi = np.searchsorted(self._x_sorted, max_x, 'right')
+        slab = self._by_x[lo:hi]
+        tail = np.arange(self._sorted_upto, self.size)
+        tail = tail[(x[tail] >= min_x) & (x[tail] <= max_x)]
+        candidates = np.concatenate((slab, tail))
+        hits = candidates[(y[candidates] >= min_y) & (y[candidates] <= max_y)][:limit]
+        return list(zip(self.column('index')[hits].tolist(), self.column('iter')[hits].tolist()))
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        if not self.size:
+            return {'entities': 0}
+        x, y = self.column('positionX'), self.column('positionY')
+        owned = self.column('owner') >= 0
+        return {
+            'entities': self.size,
+            'stacks': int(np.unique(self.column('uuid_hash')).size),
+            'owned': int(owned.sum()),
+            'owners': int(np.unique(self.column('owner')[owned]).size),
+            'minted': int(self.column('minted').sum()),
+            'bounds': [int(x.min()), int(x.max()), int(y.min()), int(y.max())],
+            'last_timestamp': float(self.column('timestamp').max()),
+        }
+
+    # Snapshots ───────────────────────────
+
+    def export(self) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+        '''Copy of the current state for ``write_snapshot`` (cheap; call on the owning thread).'''
+        arrays = {name: arr[:self.size].copy() for name, arr in self._cols.items()}
+        return arrays, {'size': self.size, 'version': self.version, 'owners': list(self.owners)}
+
+def write_snapshot(directory: Path, arrays: dict[str, np.ndarray], meta: dict[str, Any]):
+    '''
+    Write ``<column>.npy`` files and then ``meta.json``, each replaced
+    atomically. Slots are append-only, so a reader that lands between two
+    column replacements still sees aligned rows up to ``meta['size']``.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, arr in arrays.items():
+        tmp = directory / f".{name}.npy.tmp"
+        with tmp.open("wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, directory / f"{name}.npy")
+
+    tmp = directory / ".meta.json.tmp"
+    tmp.write_text(json.dumps({**meta, 'columns': list(arrays)}), encoding="utf-8")
+    os.replace(tmp, directory / "meta.json")
+
+def load_snapshot(directory: Path, mmap: bool = True) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+    '''
+    Open a snapshot written by db_server, e.g. from fe_server or a notebook:
+
+    >>> cols, meta = load_snapshot(Path('db/zone0.columns'))
+    >>> (cols['owner'] == meta['owners'].index('user:123')).sum()
+    '''
+    meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+    arrays = {}
+    for name in meta['columns']:
+        arr = np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None)
+        if len(arr) < meta['size']:
+            raise RuntimeError(f"{directory}: {name}.npy is older than meta.json, retry")
+        # Columns can be one snapshot ahead of meta.json; the first `size` rows still line up
+        arrays[name] = arr[:meta['size']]
+    return arrays, meta
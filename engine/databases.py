@@ -6,34 +6,73 @@ import contextlib
 import uuid
 import random
 import time
+import math
 from datetime import datetime, timezone
 import signal
 import hashlib
+import struct
 import asyncio
 import anyio
 import sqlite3
 from collections import OrderedDict
 from contextlib import asynccontextmanager
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 import threading
 from typing import NewType, Any, Union
 import atexit
 from .zonetables import ZONE_COLORS, ZONE_INTEGERS, ZONE_GLYPH_TABLES, ZONE_GLYPHS
+from .overlay import PendingOverlay, WriteJournal
+from .executors import ZoneExecutor
+from .caching import (
+    SegmentedLRU, estimate_row_bytes, estimate_rows_bytes,
+    VERSION_CACHE_BYTES, STACK_CACHE_ENTRIES, STACK_CACHE_BYTES,
+    TILE_CACHE_ENTRIES, TILE_CACHE_BYTES
+)
+from .mapmath import tile_of
+from . import aesthetics as aesthetic_codec
+from .columnar import LatestColumns, write_snapshot
+from . import overview as pyramid
 
 DiscordUserID = NewType('DiscordUserID', str)
 '''For ID component of `'user:00000...'`'''
 
 # These are global defaults for longevity of disk
-POOL_SIZE      = int(os.getenv("POOL_SIZE", 4))
+POOL_SIZE      = int(os.getenv("POOL_SIZE", 4)) # reader threads per zone
 FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", 2.0))
 MAX_QUEUE_ROWS = int(os.getenv("MAX_QUEUE_ROWS", 100)) # or 1000
-LRU_CACHE_SIZE = int(os.getenv("LRU_CACHE_SIZE", 256))
+CHECKPOINT_ROWS = int(os.getenv("CHECKPOINT_ROWS", 2000)) # rows flushed into a zone between WAL checkpoints
+QUEUE_HIGH_WATER = max(MAX_QUEUE_ROWS, int(os.getenv("QUEUE_HIGH_WATER", MAX_QUEUE_ROWS * 10))) # pending rows past which writes are rejected
+LRU_CACHE_SIZE = int(os.getenv("LRU_CACHE_SIZE", 256)) # single-version cache entries per zone
+TILE_VERSIONS_MAX = int(os.getenv("TILE_VERSIONS_MAX", 16384)) # tiles per zone whose render version and change marks are kept
+INDEX_BLOCK    = int(os.getenv("INDEX_BLOCK", 256)) # indices reserved per index_alloc write
+IDLE_RELEASE   = float(os.getenv("IDLE_RELEASE", 300.0)) # seconds without queries before a zone closes its connections, 0 = never
+
+# Cells per statement for multi-point lookups (2 bound variables each)
+POINTS_PER_QUERY = 500
+EXPAND_MANY_MAX  = 1024 # points per /expandmany request (fe_server splits larger areas)
+
+# Background repacking of JSON `aesthetics` into palette BLOBs
+AESTHETICS_MIGRATE_BATCH = int(os.getenv("AESTHETICS_MIGRATE_BATCH", 500)) # rows per writer job
+AESTHETICS_MIGRATE_PAUSE = float(os.getenv("AESTHETICS_MIGRATE_PAUSE", 0.05)) # seconds between jobs
+AESTHETICS_MIGRATED      = 1 # zone file `PRAGMA user_version` once the repacking pass has completed
+
+# Optional NumPy "latest view" per zone, snapshotted to db/zone{i}.columns/
+COLUMNAR                   = os.getenv("COLUMNAR", "0") == "1"
+COLUMNAR_SNAPSHOT_INTERVAL = float(os.getenv("COLUMNAR_SNAPSHOT_INTERVAL", 60.0)) # seconds, 0 = only on close
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", 1000)) # rows per reader job when streaming a zone
+
+# Full-text search over the latest name/description (FTS5 trigram index)
+SEARCH_MIN_CHARS   = 3 # trigrams: shorter queries cannot use the index
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 200)) # offset + limit cap per query
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("db")
 
 ReadableTS = lambda ts : datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
 
+GENESIS_CACHE_SIZE = int(os.getenv("GENESIS_CACHE_SIZE", 65536)) # memoized genesis cells (uuid + aesthetics)
+
 def _deterministic_rng(*parts) -> random.Random:
     key = ":".join(map(str, parts))
     seed = int(hashlib.sha256(key.encode()).hexdigest(), 16) % (2**32)
@@ -111,7 +150,7 @@ ENTITYSCHEMA = {
     'positionY'  : 'INTEGER',
     #'positionZ'  : 'INTEGER',
     
-    'aesthetics' : 'TEXT',                 # Stringified JSON with address overrides
+    'aesthetics' : 'BLOB',                 # Packed palette indices, or stringified JSON with address overrides
     'ownership'  : 'TEXT',                 # The Ownership ID
     'minted'     : 'INTEGER',              # Special status
     'timestamp'  : 'INTEGER'               # Long Integer 
@@ -194,6 +233,15 @@ def normalize_entity(ent: dict, z: int) -> dict:
     ent["positionZ"] = z
     return ent
 
+def search_phrase(query: str) -> str:
+    '''Quote user text as one FTS5 phrase (substring match under the trigram tokenizer).'''
+    return '"' + query.replace('"', '""') + '"'
+
+def merge_search_hits(hit_lists: list[list[dict]], limit: int, offset: int = 0) -> list[dict]:
+    '''Merge per-zone ``search`` hits (best ``score`` first) and cut one page.'''
+    hits = sorted((h for hits in hit_lists for h in hits), key=lambda h: (h["score"], h["zone"], h["entity"]["index"]))
+    return hits[offset:offset + limit]
+
 def entity_genesis(
         x: int, 
         y: int,
@@ -221,6 +269,147 @@ def entity_genesis(
         "exists": False,
     }
 
+# Batch genesis ───────────────────────────
+# Same output as `entity_genesis` (apart from `timestamp`), memoized per cell
+
+_BAR_KEYS   = tuple(f'channel_{i}' for i in range(8))
+_GLYPH_KEYS = tuple(f'glyph_{i}' for i in range(8))
+
+# (x, y, z) -> (uuid, bar colors, glyphs); least recently used first, guarded by _genesis_lock
+_genesis_memo: OrderedDict[tuple[int, int, int], tuple[str, tuple, tuple]] = OrderedDict()
+_genesis_lock = threading.Lock()
+
+_GENESIS_WORDS = 48 # 32-bit outputs drawn per cell by the fast path (16 choices need ~27)
+
+def _genesis_seed(x: int, y: int, z: int) -> int:
+    '''``_deterministic_rng(x, y, z)``'s seed: the low 32 bits of the sha256 digest.'''
+    return int.from_bytes(hashlib.sha256(f"{x}:{y}:{z}".encode()).digest()[-4:], 'big')
+
+def _genesis_parts_exact(rng: random.Random, x: int, y: int, z: int) -> tuple[str, tuple, tuple]:
+    '''
+    The seeded parts of one genesis cell, drawn with the same calls as
+    ``entity_genesis`` and ``DeterministicAesthetic`` on a reused ``rng``.
+    '''
+    seed = _genesis_seed(x, y, z)
+    rng.seed(seed)
+    uid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    rng.seed(seed)  # the aesthetics come from the start of the same stream
+    colors, glyphs = ZONE_COLORS[z], ZONE_GLYPHS[z]
+    bar = tuple(rng.choice(colors) for _ in _BAR_KEYS)
+    glyph = tuple(rng.choice(glyphs) for _ in _GLYPH_KEYS)
+    return uid, bar, glyph
+
+def _genesis_parts_fast(rng: random.Random, x: int, y: int, z: int) -> tuple[str, tuple, tuple]:
+    '''
+    ``_genesis_parts_exact`` with one seeding instead of two (seeding is most
+    of the cost). Both the uuid and the choices read the start of the stream:
+    ``getrandbits(128)`` is its first four 32-bit outputs, little end first,
+    and ``choice(seq)`` takes the top ``len(seq).bit_length()`` bits of the
+    next output until they fall below ``len(seq)``.
+    '''
+    seed = _genesis_seed(x, y, z)
+    rng.seed(seed)
+    bits = rng.getrandbits(32 * _GENESIS_WORDS)
+    words = iter(struct.unpack(f'<{_GENESIS_WORDS}I', bits.to_bytes(4 * _GENESIS_WORDS, 'little')))
+    picked = []
+    try:
+        for seq, keys in ((ZONE_COLORS[z], _BAR_KEYS), (ZONE_GLYPHS[z], _GLYPH_KEYS)):
+            n = len(seq)
+            shift = 32 - n.bit_length()
+            for _ in keys:
+                r = next(words) >> shift
+                while r >= n:
+                    r = next(words) >> shift
+                picked.append(seq[r])
+    except StopIteration:  # an unusually long run of rejections
+        return _genesis_parts_exact(rng, x, y, z)
+    uid = str(uuid.UUID(int=bits & ((1 << 128) - 1), version=4))
+    return uid, tuple(picked[:8]), tuple(picked[8:])
+
+def _fast_genesis_matches() -> bool:
+    '''The fast path leans on CPython's ``choice``/``getrandbits``; check it on a few cells per zone.'''
+    rng = random.Random()
+    return all(
+        _genesis_parts_fast(rng, x, y, z) == _genesis_parts_exact(rng, x, y, z)
+        for z in ZONE_INTEGERS for x, y in ((1, 1), (8, 3), (-5, 4096), (10**9, 7))
+    )
+
+_genesis_parts = _genesis_parts_fast if _fast_genesis_matches() else _genesis_parts_exact
+
+def genesis_many(points: Iterable[tuple[int, int, int]]) -> list[dict]:
+    '''
+    ``entity_genesis`` for many ``(x, y, z)`` cells at once (a tile, an area
+    request). Seeded parts are memoized per cell (``GENESIS_CACHE_SIZE``),
+    so a cell costs one sha256 and one seeding only the first time; every
+    call returns fresh dicts sharing one ``timestamp``. The memo is an LRU
+    taken once for the lookups and once for the inserts; misses are
+    generated outside the lock.
+    '''
+    now = time.time()
+    points = [(x, y, z) for x, y, z in points]
+    with _genesis_lock:
+        found = []
+        for point in points:
+            parts = _genesis_memo.get(point)
+            if parts is not None:
+                _genesis_memo.move_to_end(point)
+            found.append(parts)
+
+    missing = {point for point, parts in zip(points, found) if parts is None}
+    if missing:
+        rng = random.Random()
+        generated = {point: _genesis_parts(rng, *point) for point in missing}
+        with _genesis_lock:
+            _genesis_memo.update(generated)
+            while len(_genesis_memo) > GENESIS_CACHE_SIZE:
+                _genesis_memo.popitem(last=False)
+        found = [generated[point] if parts is None else parts for point, parts in zip(points, found)]
+
+    out = []
+    for (x, y, z), (uid, bar, glyph) in zip(points, found):
+        out.append({
+            "index": None,
+            "iter": 0,
+            "uuid": uid,
+            "state": 0,
+            "name": "Void",
+            "description": "Genesis",
+            "positionX": x,
+            "positionY": y,
+            "positionZ": z,
+            "aesthetics": {'bar': dict(zip(_BAR_KEYS, bar)), 'glyphs': dict(zip(_GLYPH_KEYS, glyph))},
+            "ownership": None,
+            "minted": False,
+            "timestamp": now,
+            "exists": False,
+        })
+    return out
+
+class WriteRejected(Exception):
+    '''
+    A write was not admitted: the zone's pending queue is past
+    ``QUEUE_HIGH_WATER`` (429, retry later) or the zone cannot flush at all
+    (503). Nothing was journaled.
+    '''
+    def __init__(self, zone: int, status_code: int, reason: str, queue_depth: int, retry_after: int):
+        super().__init__(f"zone {zone}: write rejected ({reason}, {queue_depth} rows pending)")
+        self.zone = zone
+        self.status_code = status_code
+        self.reason = reason
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+    @property
+    def detail(self) -> dict:
+        return {
+            'message': str(self),
+            'reason': self.reason,
+            'zone': self.zone,
+            'queue_depth': self.queue_depth,
+            'high_water': QUEUE_HIGH_WATER,
+            'retry_after': self.retry_after,
+        }
+
 class BaseStore:
     def __init__(
             self,
@@ -232,13 +421,23 @@ class BaseStore:
         self.name = path.name
         self.pool_size = pool_size
 
-        self._pool: asyncio.Queue[sqlite3.Connection] = asyncio.Queue()
+        # One pinned writer thread + `pool_size` pinned reader threads
+        self._executor = ZoneExecutor(path.stem, self._connect, pool_size, setup=self._setup_schema)
         self._write_lock = anyio.Lock()
         self._running = False
         self._flush_task: asyncio.Task | None = None
 
-        # Read-throough LRU cache. Key: "index:iter"
-        self._cache: OrderedDict[str, Any] = OrderedDict()
+        # Read-through cache tiers, all charged to the process-wide budget
+        # - versions: single rows.              Key: (index, iter)
+        # - stacks:   persisted rows at a cell. Key: (positionX, positionY)
+        # - tiles:    latest rows per 8x8 tile. Key: (tile_x, tile_y)
+        self._versions = SegmentedLRU(f"{path.stem}:versions", LRU_CACHE_SIZE, VERSION_CACHE_BYTES)
+        self._stacks   = SegmentedLRU(f"{path.stem}:stacks", STACK_CACHE_ENTRIES, STACK_CACHE_BYTES)
+        self._tiles    = SegmentedLRU(f"{path.stem}:tiles", TILE_CACHE_ENTRIES, TILE_CACHE_BYTES)
+
+        # Pending writes (not yet in `entities`), durable through the journal
+        self._overlay = PendingOverlay()
+        self._journal = WriteJournal(path.with_suffix('.journal'))
         
         # Metrics
         self.started      = time.time()
@@ -252,86 +451,321 @@ class BaseStore:
     def metrics(self):
         return {
             'started': datetime.fromtimestamp(self.started).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            'open': self._running,
             'flushes': self.flushes,
             'writes': self.writes,
             'cache_hits': self.cache_hits,
             'cache_misses': self.cache_misses,
-            'queue_depth': self.queue_depth
+            'queue_depth': self.queue_depth,
+            'cache': {
+                'versions': self._versions.metrics,
+                'stacks': self._stacks.metrics,
+                'tiles': self._tiles.metrics,
+            },
+            'executor': self._executor.metrics
         }
 
+    def _connect(self) -> sqlite3.Connection:
+        '''Open a connection for the calling (pinned) executor thread.'''
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        # Performance Optimizations
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA mmap_size=16777216;") # About 16-64 MB
+        return conn
+
+    def _setup_schema(self, conn: sqlite3.Connection):
+        '''Subclass hook: create tables and indexes on the writer connection before it takes jobs.'''
+        return None
+
 class EntityStore(BaseStore):
     def __init__(
             self, 
             path: Path,
-            pool_size: int = POOL_SIZE
+            pool_size: int = POOL_SIZE,
+            zone: int | None = None  # zone integer; enables packed aesthetics
         ):
         super().__init__(path, pool_size) # __init>
+        self.zone = zone
+        self.keep_open = False  # hot zones never release their connections
+        self.scheduler = None   # FlushScheduler flushing this zone; None = own loop
+        self.pending_since: float | None = None  # monotonic time the oldest pending row arrived
+        self.rows_since_checkpoint = 0
+        self.drain_rate = 0.0       # rows/s committed by recent flushes, smoothed
+        self.flush_failing = False  # last commit raised; writes are refused until one succeeds
+        self.rejected = 0
+        self._flush_wanted = asyncio.Event()  # wakes _flush_loop early when there is no scheduler
+        self._open_lock = anyio.Lock()
+        self._migrate_task: asyncio.Task | None = None
+        self.aesthetics_packed = 0
+
+        # Columnar latest view (COLUMNAR=1), built in init()
+        self._columns: LatestColumns | None = None
+        self._columns_dir = path.with_suffix('.columns')
+        self._snapshot_version = -1
+        self._snapshot_at = 0.0
+
+        # Current block of reserved indices: [_next_index, _block_end)
+        self._alloc_lock = anyio.Lock()
+        self._next_index = 0
+        self._block_end  = 0
+
+        # Render versions of the TILE_VERSIONS_MAX most recently written 8x8
+        # tiles, from a zone-wide clock bumped when _flush commits; the epoch
+        # keeps them distinct across restarts. Every other tile reports the
+        # floor: the highest version of a tile dropped from the table.
+        self._tile_epoch = uuid.uuid4().hex[:8]
+        self._tile_clock = 0
+        self._tile_floor = 0
+        # (tile_x, tile_y) -> (version, tracked since, {(x, y): version the cell last changed})
+        self._tile_versions: OrderedDict[tuple[int, int], tuple[int, int, dict[tuple[int, int], int]]] = OrderedDict()
 
-    async def init(self):
-        global ENTITYSCHEMA
-        if self._running:
-            return
-        
-        logger.info(f"Initializing DB at {str(self.path.resolve())} with pool size {self.pool_size}")
+    @property
+    def metrics(self):
+        return {
+            **super().metrics,
+            'aesthetics_packed': self.aesthetics_packed,
+            'admission': {
+                'high_water': QUEUE_HIGH_WATER,
+                'rejected': self.rejected,
+                'drain_rate': round(self.drain_rate, 1),
+                'flush_failing': self.flush_failing,
+            }
+        }
 
+    def _setup_schema(self, conn: sqlite3.Connection):
+        global ENTITYSCHEMA
         index_cols = {"'index'": 'INTEGER NOT NULL', "'iter'": 'INTEGER NOT NULL'}
 
-        for _ in range(self.pool_size):
-            conn = sqlite3.connect(
-                self.path,
-                check_same_thread=False,
-                isolation_level=None
+        # main table
+        conn.execute(unwrap_kv_to_create_schema(ENTITYSCHEMA, 'entities', index_cols))
+
+        # Single-row high-water mark for `index` allocation, reserved in blocks
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_alloc (
+                id   INTEGER PRIMARY KEY CHECK (id = 0),
+                next INTEGER NOT NULL
             )
-            # Performance Optimizations
-            conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute("PRAGMA synchronous=NORMAL;")
-            conn.execute("PRAGMA temp_store=MEMORY;")
-            conn.execute("PRAGMA mmap_size=16777216;") # About 16-64 MB
-            
-            # main table
-            conn.execute(unwrap_kv_to_create_schema(ENTITYSCHEMA, 'entities', index_cols))
-            
-            # queue table
-            conn.execute(unwrap_kv_to_create_schema(ENTITYSCHEMA, 'write_queue', index_cols, is_queue=True))
+        """)
+        # One-time compaction: the per-entity `index_seq` rows are superseded
+        # (the high-water mark is recomputed from the data on every start)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='index_seq'").fetchone():
+            conn.execute("DROP TABLE index_seq")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name='index_seq'")
+            logger.info(f"Dropped index_seq from {self.name} (replaced by index_alloc)")
+        
+        # Fast lookup by ownership
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ownership_latest
+            ON entities(ownership, "index", iter DESC)
+        """)
+        # Fast lookup by UUID
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uuid ON entities(uuid)")
+        # Fast 2D spatial queries
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pos ON entities(positionX, positionY)")
+        # Index for fast retrieval of latest versions
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_latest ON entities('index', 'iter' DESC)")
+        # Time axis: newest version of an index at or before a timestamp
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_index_time ON entities("index", timestamp, iter)')
+
+        # R*Tree over entity positions, one box per index (positions never move)
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS entities_rtree
+            USING rtree(id, minX, maxX, minY, maxY)
+        """)
+        # Backfill existing zone files (no-op once populated)
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM entities_rtree)").fetchone()[0]:
+            conn.execute("""
+                INSERT OR IGNORE INTO entities_rtree (id, minX, maxX, minY, maxY)
+                SELECT DISTINCT "index", positionX, positionX, positionY, positionY
+                FROM entities
+            """)
 
-            # sequence table to allocate unique `index` values atomically
-            conn.execute("CREATE TABLE IF NOT EXISTS index_seq (id INTEGER PRIMARY KEY AUTOINCREMENT)")
-            
-            # Fast lookup by ownership
+        # Materialized latest iteration per index, maintained by _flush
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entities_latest (
+                "index"   INTEGER PRIMARY KEY,
+                iter      INTEGER NOT NULL,
+                uuid      TEXT,
+                ownership TEXT,
+                positionX INTEGER,
+                positionY INTEGER
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_el_ownership ON entities_latest(ownership, "index")')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_el_uuid ON entities_latest(uuid, ownership, iter)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_el_pos ON entities_latest(positionX, positionY)")
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM entities_latest)").fetchone()[0]:
             conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_ownership_latest
-                ON entities(ownership, "index", iter DESC)
+                INSERT OR IGNORE INTO entities_latest
+                SELECT e."index", e.iter, e.uuid, e.ownership, e.positionX, e.positionY
+                FROM entities e
+                WHERE e.iter = (SELECT MAX(iter) FROM entities WHERE "index" = e."index")
             """)
-            # Fast lookup by UUID
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_uuid ON entities(uuid)")
-            # Fast 2D spatial queries
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_pos ON entities(positionX, positionY)")
-            # Index for fast retrieval of latest versions
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_latest ON entities('index', 'iter' DESC)")
-            
-            await self._pool.put(conn)
+
+        # Per-owner inventory: the top (max iter) latest row of each stack an
+        # owner holds, plus a running stack count per owner; maintained by _flush
+        inventory_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='owner_inventory'").fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS owner_inventory (
+                uuid      TEXT NOT NULL,
+                ownership TEXT NOT NULL,
+                "index"   INTEGER NOT NULL,
+                iter      INTEGER NOT NULL,
+                PRIMARY KEY (uuid, ownership)
+            ) WITHOUT ROWID
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_inv_owner ON owner_inventory(ownership, "index", iter)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS owner_totals (
+                ownership TEXT PRIMARY KEY,
+                stacks    INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        if not inventory_exists:
+            conn.execute("""
+                INSERT INTO owner_inventory (uuid, ownership, "index", iter)
+                SELECT uuid, ownership, "index", MAX(iter)
+                FROM entities_latest
+                WHERE ownership IS NOT NULL AND uuid IS NOT NULL
+                GROUP BY uuid, ownership
+            """)
+            conn.execute("""
+                INSERT INTO owner_totals (ownership, stacks)
+                SELECT ownership, COUNT(*) FROM owner_inventory GROUP BY ownership
+            """)
+
+        # Multi-resolution density/ownership summaries, maintained by _flush
+        if pyramid.setup(conn):
+            conn.execute("BEGIN")
+            pyramid.backfill(conn)
+            conn.execute("COMMIT")
+
+        # Full-text index over the latest name/description, rowid = index
+        fts_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='entities_fts'").fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts
+            USING fts5(name, description, tokenize='trigram')
+        """)
+        if not fts_exists:
+            conn.execute("""
+                INSERT INTO entities_fts (rowid, name, description)
+                SELECT e."index", e.name, e.description
+                FROM entities_latest l
+                CROSS JOIN entities e
+                ON e."index" = l."index"
+                AND e.iter = l.iter
+            """)
+
+    async def open(self):
+        '''Initialize on first use; concurrent callers wait for the same init.'''
+        if self._running:
+            return
+        async with self._open_lock:
+            await self.init()
+
+    async def init(self):
+        if self._running:
+            return
         
+        logger.info(f"Initializing DB at {str(self.path.resolve())} with {self.pool_size} readers")
+
+        # The writer thread creates the schema before it takes any job
+        self._executor.start()
+
+        # Recover unflushed writes: the legacy write_queue table, then the journal.
+        # Rows queued before aesthetics were packed still hold JSON text; pack
+        # them here, since the repacking pass only sees rows already on file.
+        legacy = await self._executor.write(self._read_legacy_queue)
+        for row in [*legacy, *self._journal.replay()]:
+            if isinstance(row[8], str) and (packed := aesthetic_codec.pack(row[8], self.zone)):
+                row = (*row[:8], packed, *row[9:])
+            self._overlay.put(row)
+        if legacy:
+            self._journal.rewrite(self._overlay.rows(), fsync=True)
+            await self._executor.write(lambda conn: conn.execute("DROP TABLE write_queue"))
+            logger.info(f"Migrated {len(legacy)} write_queue rows into {self._journal.path.name}")
+        self.queue_depth = len(self._overlay)
+        if self.queue_depth:
+            self.pending_since = time.monotonic()
+            logger.info(f"Recovered {self.queue_depth} pending writes for {self.name}")
+
+        # Reserved-but-unused indices from the last run are handed out again
+        pending = max((r[0] for r in self._overlay.rows()), default=0)
+        self._next_index = self._block_end = await self._executor.write(self._reclaim_indices, pending)
+        
+        if COLUMNAR:
+            self._columns = await self._executor.read(LatestColumns.build)
+            logger.info(f"Loaded {len(self._columns)} latest rows into columns for {self.name}")
+
         self._running = True
         self._flush_task = asyncio.create_task(self._flush_loop())
+        if self.zone is not None:
+            self._migrate_task = asyncio.create_task(self._migrate_aesthetics())
+
+    @staticmethod
+    def _read_legacy_queue(conn: sqlite3.Connection) -> list[tuple]:
+        '''Rows left in a pre-journal ``write_queue`` table, oldest first.'''
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='write_queue'"
+        ).fetchone()
+        if not exists:
+            return []
+        rows = conn.execute("SELECT * FROM write_queue ORDER BY queue_id").fetchall()
+        return [tuple(r[1:]) for r in rows]  # strip queue_id
 
     async def close(self):
         logger.info("Stopping...")
         self._running = False
-        if self._flush_task:
-            self._flush_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await self._flush_task
+        for task in (self._flush_task, self._migrate_task):
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
         await self._flush(force=True)
-        while not self._pool.empty():
-            (await self._pool.get()).close()
-
-    @asynccontextmanager
-    async def _conn(self):
-        conn = await self._pool.get()
-        try:
-            yield conn
-        finally:
-            await self._pool.put(conn)
+        await self._snapshot_columns()
+        self._journal.close()
+        await self._executor.stop()
+
+    @staticmethod
+    def _reclaim_indices(conn: sqlite3.Connection, pending: int) -> int:
+        '''Rewind ``index_alloc`` to just past the highest index on file or pending.'''
+        on_file = conn.execute('SELECT MAX("index") FROM entities').fetchone()[0] or 0
+        start = max(on_file, pending) + 1
+        conn.execute("""
+            INSERT INTO index_alloc (id, next) VALUES (0, ?)
+            ON CONFLICT(id) DO UPDATE SET next = excluded.next
+        """, (start,))
+        return start
+
+    @staticmethod
+    def _reserve_block(conn: sqlite3.Connection, size: int) -> tuple[int, int]:
+        end = conn.execute(
+            "UPDATE index_alloc SET next = next + ? WHERE id = 0 RETURNING next", (size,)
+        ).fetchone()[0]
+        return end - size, end
+
+    async def allocate_index(self) -> int:
+        '''
+        Allocate a unique entity ``index``. Indices are handed out from an
+        in-memory block; only every ``INDEX_BLOCK``-th call touches the
+        writer thread to reserve the next block.
+        '''
+        async with self._alloc_lock:
+            if self._next_index >= self._block_end:
+                self._next_index, self._block_end = await self._executor.write(self._reserve_block, INDEX_BLOCK)
+            index = self._next_index
+            self._next_index += 1
+            return index
+
+    async def max_index(self) -> int:
+        '''Highest ``index`` on file or pending, 0 for an empty zone.'''
+        row = await self._executor.read(
+            lambda conn: conn.execute('SELECT MAX("index") FROM entities').fetchone()
+        )
+        on_file = row[0] if row and row[0] is not None else 0
+        return max([on_file, *(r[0] for r in self._overlay.rows())])
 
     async def get_by_ownership_cursor(
             self,
@@ -347,12 +781,14 @@ class EntityStore(BaseStore):
         OFFSET-based queries. This provides stable ordering and predictable
         performance for large ownership sets, even under concurrent writes.
 
-        Only the **latest iteration (max iter)** of each entity index is returned.
+        Only the **latest iteration (max iter)** of each stack the owner
+        holds is returned.
 
-        Requires the composite index::
+        Reads from ``owner_inventory``, which ``_flush`` keeps at one row per
+        (stack, owner), through the covering index::
 
-            CREATE INDEX idx_ownership_latest
-            ON entities(ownership, "index", iter DESC)
+            CREATE INDEX idx_inv_owner
+            ON owner_inventory(ownership, "index", iter)
 
         :param ownership:
             Ownership identifier
@@ -366,9 +802,8 @@ class EntityStore(BaseStore):
             If ``None``, pagination starts from the beginning.
 
         :param include_totals:
-            If ``True``, include ``total_entities`` and ``estimated_pages`` in the
-            response. This incurs an additional grouped COUNT query and should be
-            used sparingly for large datasets.
+            If ``True``, include ``total`` (stacks held) in the response, a
+            single-row lookup in ``owner_totals``.
 
         :returns:
             A dictionary containing entities and pagination metadata, including
@@ -393,115 +828,453 @@ class EntityStore(BaseStore):
 
         page_size = max(1, min(page_size, 1000))
 
-        async with self._conn() as conn:
+        params = [ownership]
 
-            params = [ownership, ownership]
+        cursor_clause = ""
+        if after_index is not None:
+            cursor_clause = 'AND i."index" > ?'
+            params.append(after_index)
 
-            cursor_clause = ""
-            if after_index is not None:
-                cursor_clause = 'AND e."index" > ?'
-                params.append(after_index)
+        sql = f"""
+            SELECT e.*
+            FROM owner_inventory i
+            CROSS JOIN entities e
+            ON e."index" = i."index"
+            AND e.iter = i.iter
+            WHERE i.ownership = ?
+            {cursor_clause}
+            ORDER BY i."index"
+            LIMIT ?
+        """
 
-            sql = f"""
-                SELECT e.*
-                FROM entities e
-                JOIN (
-                    SELECT uuid, MAX(iter) AS max_iter
-                    FROM entities
-                    WHERE ownership = ?
-                    GROUP BY uuid
-                ) latest
-                ON e.uuid = latest.uuid
-                AND e.iter = latest.max_iter
-                WHERE e.ownership = ?
-                {cursor_clause}
-                ORDER BY e."index"
-                LIMIT ?
-            """
-
-            if __debug__:
-                expected = sql.count("?")
-                actual = len(params) + 1
-                assert expected == actual
-
-            rows = await anyio.to_thread.run_sync(
-                lambda: conn.execute(
-                    sql,
-                    params + [page_size + 1]
-                ).fetchall()
-            )
+        if __debug__:
+            expected = sql.count("?")
+            actual = len(params) + 1
+            assert expected == actual
+
+        def _fetch(conn: sqlite3.Connection):
+            rows = conn.execute(sql, params + [page_size + 1]).fetchall()
 
             total = None
             if include_totals:
-                total = await anyio.to_thread.run_sync(
-                    lambda: conn.execute(
-                        """
-                        SELECT COUNT(*)
-                        FROM (
-                            SELECT uuid
-                            FROM entities
-                            WHERE ownership = ?
-                            GROUP BY uuid
-                        )
-                        """,
-                        (ownership,)
-                    ).fetchone()[0]
-                )
+                total = self._owner_total(conn, ownership)
 
-            has_more = len(rows) > page_size
-            rows = rows[:page_size]
+            return rows, total
 
-            next_cursor = rows[-1][0] if rows else None
+        rows, total = await self._executor.read(_fetch)
 
-            return {
-                "rows": [self._row_to_dict(r) for r in rows],
-                "next_cursor": next_cursor,
-                "has_more": has_more,
-                "total": total,
-            }
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        next_cursor = rows[-1][0] if rows else None
+
+        return {
+            "rows": [self._row_to_dict(r) for r in rows],
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "total": total,
+        }
+
+
+    @staticmethod
+    def _owner_total(conn: sqlite3.Connection, ownership: str) -> int:
+        row = conn.execute("SELECT stacks FROM owner_totals WHERE ownership = ?", (ownership,)).fetchone()
+        return row[0] if row else 0
+
+    async def owner_total(self, ownership: str) -> int:
+        '''Stacks whose latest iteration ``ownership`` holds on file (flushed rows only).'''
+        return await self._executor.read(self._owner_total, ownership)
+
+    async def export(
+            self,
+            after_index: int | None = None,
+            ownership: str | None = None,
+            include_pending: bool = False,
+            batch_size: int = EXPORT_BATCH
+        ):
+        '''
+        Stream a zone in ``index`` order as batches of row dicts.
+
+        Every version in ``entities`` is included. With ``ownership``, only
+        the latest row per stack of that owner is included, as pages of
+        ``get_by_ownership_cursor``. Each batch is a separate keyset query on
+        a reader thread, so memory stays constant and no read transaction
+        stays open between batches. Resume with the last ``index`` you
+        fully received as ``after_index``.
+
+        ``include_pending`` merges unflushed versions from the overlay,
+        which replace their on-file counterpart, in key order.
+
+        >>> async for rows in store.export(after_index=1200):
+        ...     mirror.write(rows)
+        '''
+        if ownership is not None:
+            cursor = after_index
+            while True:
+                page = await self.get_by_ownership_cursor(ownership, batch_size, cursor)
+                if page["rows"]:
+                    yield page["rows"]
+                if not page["has_more"]:
+                    return
+                cursor = page["next_cursor"]
+
+        # Pending rows are snapshotted up front and merged by (index, iter)
+        pending = sorted(
+            (r for r in self._overlay.rows() if include_pending and (after_index is None or r[0] > after_index)),
+            key=lambda r: (r[0], r[1])
+        )
+        p = 0
 
+        key = (after_index if after_index is not None else -1, 2**63 - 1)
+        while True:
+            rows = await self._executor.read(
+                lambda conn, key=key: conn.execute(
+                    """
+                    SELECT * FROM entities
+                    WHERE ("index", iter) > (?, ?)
+                    ORDER BY "index", iter
+                    LIMIT ?
+                    """,
+                    (*key, batch_size)
+                ).fetchall()
+            )
+
+            out = []
+            for row in rows:
+                while p < len(pending) and (pending[p][0], pending[p][1]) < (row[0], row[1]):
+                    out.append(pending[p])
+                    p += 1
+                if p < len(pending) and (pending[p][0], pending[p][1]) == (row[0], row[1]):
+                    row = pending[p]
+                    p += 1
+                out.append(row)
+            if len(rows) < batch_size:
+                out.extend(pending[p:])
+
+            if out:
+                yield [self._row_to_dict(r) for r in out]
+            if len(rows) < batch_size:
+                return
+            key = (rows[-1][0], rows[-1][1])
+
+    async def search(self, query: str, limit: int = 20, offset: int = 0) -> list[dict]:
+        '''
+        Entities whose latest ``name`` or ``description`` contains ``query``
+        (case-insensitive substring, at least ``SEARCH_MIN_CHARS`` characters).
+
+        Served by the ``entities_fts`` trigram index, which ``_flush`` keeps
+        in sync with ``entities_latest``; unflushed writes are not searchable
+        yet. Ranked by bm25 with name matches weighted over description
+        matches; lower ``score`` is better. Returns
+        ``[{'zone', 'score', 'entity'}, ...]``.
+        '''
+        def _fetch(conn: sqlite3.Connection):
+            return conn.execute(
+                """
+                SELECT e.*, bm25(entities_fts, 2.0, 1.0) AS score
+                FROM entities_fts f
+                CROSS JOIN entities_latest l
+                ON l."index" = f.rowid
+                CROSS JOIN entities e
+                ON e."index" = l."index"
+                AND e.iter = l.iter
+                WHERE entities_fts MATCH ?
+                ORDER BY score, e."index"
+                LIMIT ? OFFSET ?
+                """,
+                (search_phrase(query), limit, offset)
+            ).fetchall()
+
+        rows = await self._executor.read(_fetch)
+        return [
+            {'zone': self.zone, 'score': row[-1], 'entity': self._row_to_dict(row[:-1])}
+            for row in rows
+        ]
 
     async def range_query(self, bounds: dict):
         '''
         >>> bounds = { 'min_x': 0, 'max_x': 100, ... }
         Returns the LATEST (max iter) version for every entity within bounds.
+
+        Candidate indices come from the ``entities_rtree`` R*Tree and are
+        resolved to their latest iter through ``entities_latest``. R*Tree
+        coordinates are 32-bit floats rounded outward, so the exact integer
+        bounds are re-checked on the joined row. ``CROSS JOIN`` pins the join
+        order so the planner never falls back to scanning ``idx_pos``.
+
+        Bounds covering exactly one aligned tile (``mapmath.expand_sequence``)
+        are served from the tile cache, which ``set`` and ``_flush`` invalidate.
+
+        With ``COLUMNAR=1`` the candidates come from a vectorized mask over
+        the in-memory latest view instead, and only the matching rows are
+        read from ``entities`` by primary key.
+
+        ``bounds['as_of']`` (a timestamp) returns, per index, the newest
+        version at or before that time instead (see ``_range_as_of``).
         '''
+        if bounds.get('as_of') is not None:
+            return await self._range_as_of(bounds)
+
+        tile = self._tile_key(bounds)
+        if tile is not None:
+            cached = self._tiles.get(tile)
+            if cached is not None:
+                return list(cached)
+            token = self._tiles.token()
+
         sql = """
             SELECT e.*
-            FROM entities e
-            JOIN (
-                SELECT "index", MAX("iter") AS max_iter
-                FROM entities
-                WHERE positionX BETWEEN ? AND ?
-                AND positionY BETWEEN ? AND ?
-                GROUP BY "index"
-            ) latest
-            ON e."index" = latest."index"
-            AND e."iter" = latest.max_iter
+            FROM entities_rtree r
+            CROSS JOIN entities_latest l
+            ON l."index" = r.id
+            CROSS JOIN entities e
+            ON e."index" = l."index"
+            AND e."iter" = l.iter
+            WHERE r.maxX >= ? AND r.minX <= ?
+            AND r.maxY >= ? AND r.minY <= ?
+            AND l.positionX BETWEEN ? AND ?
+            AND l.positionY BETWEEN ? AND ?
             LIMIT ?
         """
         params = (
+            bounds['min_x'], bounds['max_x'],
+            bounds['min_y'], bounds['max_y'],
             bounds['min_x'], bounds['max_x'],
             bounds['min_y'], bounds['max_y'],
             bounds.get('limit', 8*8)
         )
 
-        async with self._conn() as conn:
-            rows = await anyio.to_thread.run_sync(
-                lambda: conn.execute(sql, params).fetchall()
+        if self._columns is not None:
+            keys = self._columns.range_keys(*params[:4], params[-1])
+            rows = await self._executor.read(self._fetch_versions, keys) if keys else []
+        else:
+            rows = await self._executor.read(
+                lambda conn: conn.execute(sql, params).fetchall()
             )
         
+        result = [self._row_to_dict(r) for r in rows]
+        if tile is not None:
+            self._tiles.put(tile, result, estimate_rows_bytes(result), token)
+            return list(result)
+        return result
+
+    async def _range_as_of(self, bounds: dict) -> list[dict]:
+        '''
+        Map "as of" a timestamp: R*Tree candidates, then one probe of
+        ``idx_index_time`` per index for its newest version at or before
+        ``as_of``. Indices created after ``as_of`` have no such version and
+        drop out of the join.
+        '''
+        sql = """
+            SELECT e.*
+            FROM entities_rtree r
+            CROSS JOIN entities e
+            ON e."index" = r.id
+            AND e.iter = (
+                SELECT h.iter FROM entities h
+                WHERE h."index" = r.id
+                AND h.timestamp <= ?
+                ORDER BY h.timestamp DESC, h.iter DESC
+                LIMIT 1
+            )
+            WHERE r.maxX >= ? AND r.minX <= ?
+            AND r.maxY >= ? AND r.minY <= ?
+            AND e.positionX BETWEEN ? AND ?
+            AND e.positionY BETWEEN ? AND ?
+            LIMIT ?
+        """
+        params = (
+            bounds['as_of'],
+            bounds['min_x'], bounds['max_x'],
+            bounds['min_y'], bounds['max_y'],
+            bounds['min_x'], bounds['max_x'],
+            bounds['min_y'], bounds['max_y'],
+            bounds.get('limit', 8*8)
+        )
+        rows = await self._executor.read(lambda conn: conn.execute(sql, params).fetchall())
         return [self._row_to_dict(r) for r in rows]
 
+    async def timeline(
+            self,
+            bounds: dict,
+            since: float | None = None,
+            until: float | None = None,
+            batch_size: int = EXPORT_BATCH
+        ):
+        '''
+        Every persisted version inside ``bounds`` in timestamp order, as
+        batches of row dicts, for playback. Batches are keyset-paginated on
+        ``(timestamp, index, iter)``, so a long history streams in constant
+        memory.
+        '''
+        sql = """
+            SELECT e.*
+            FROM entities_rtree r
+            CROSS JOIN entities e
+            ON e."index" = r.id
+            WHERE r.maxX >= ? AND r.minX <= ?
+            AND r.maxY >= ? AND r.minY <= ?
+            AND e.positionX BETWEEN ? AND ?
+            AND e.positionY BETWEEN ? AND ?
+            AND e.timestamp <= ?
+            AND (e.timestamp, e."index", e.iter) > (?, ?, ?)
+            ORDER BY e.timestamp, e."index", e.iter
+            LIMIT ?
+        """
+        box = (
+            bounds['min_x'], bounds['max_x'], bounds['min_y'], bounds['max_y'],
+            bounds['min_x'], bounds['max_x'], bounds['min_y'], bounds['max_y'],
+            until if until is not None else float('inf')
+        )
+        key = (since if since is not None else float('-inf'), -1, -1)
+        while True:
+            rows = await self._executor.read(
+                lambda conn, key=key: conn.execute(sql, (*box, *key, batch_size)).fetchall()
+            )
+            if rows:
+                yield [self._row_to_dict(r) for r in rows]
+            if len(rows) < batch_size:
+                return
+            key = (rows[-1][11], rows[-1][0], rows[-1][1])
+
+    @staticmethod
+    def _fetch_versions(conn: sqlite3.Connection, keys: list[tuple[int, int]]) -> list[tuple]:
+        '''``entities`` rows for ``(index, iter)`` keys, by primary key.'''
+        rows = []
+        for n in range(0, len(keys), POINTS_PER_QUERY):
+            chunk = keys[n:n + POINTS_PER_QUERY]
+            values = ", ".join(["(?, ?)"] * len(chunk))
+            rows.extend(conn.execute(
+                f"""
+                WITH k(i, t) AS (VALUES {values})
+                SELECT e.*
+                FROM k
+                CROSS JOIN entities e
+                ON e."index" = k.i
+                AND e.iter = k.t
+                """,
+                [v for key in chunk for v in key]
+            ).fetchall())
+        return rows
+
+    def tile_version(self, tile_x: int, tile_y: int) -> str:
+        '''
+        Opaque version of what ``range_query`` returns for one 8x8 tile. It
+        changes whenever a flush commits rows into the tile (``range_query``
+        reads committed rows only), so callers may cache anything derived
+        from the tile under it.
+        '''
+        entry = self._tile_versions.get((tile_x, tile_y))
+        return f"{self._tile_epoch}.{entry[0] if entry else self._tile_floor}"
+
+    def tile_changes(self, tile_x: int, tile_y: int, since: str) -> tuple[str, list[tuple[int, int]] | None]:
+        '''
+        ``(current version, cells changed after since)`` for one tile, where
+        ``since`` is a version from ``tile_version``. The cells are ``None``
+        when ``since`` is not from this process (restarted), not valid, or
+        older than the change marks kept for the tile, and the caller needs
+        the whole tile.
+        '''
+        current, tracked_since, marks = self._tile_versions.get((tile_x, tile_y), (self._tile_floor, self._tile_floor, {}))
+        version = f"{self._tile_epoch}.{current}"
+        epoch, _, n = since.partition('.')
+        if epoch != self._tile_epoch or not n.isdigit() or not tracked_since <= int(n) <= current:
+            return version, None
+        return version, sorted(cell for cell, v in marks.items() if v > int(n))
+
+    async def overview(self, bounds: dict, grid: int = pyramid.OVERVIEW_GRID) -> dict:
+        '''Block summaries covering ``bounds`` at a zoom level with at most ``grid`` blocks per side (flushed rows only).'''
+        return await self._executor.read(pyramid.query, bounds, grid)
+
+    async def stats(self) -> dict:
+        '''Zone statistics over the latest iteration of every entity.'''
+        if self._columns is not None:
+            return self._columns.stats
+
+        def _aggregate(conn: sqlite3.Connection) -> dict:
+            r = conn.execute("""
+                SELECT
+                    COUNT(*), COUNT(DISTINCT l.uuid),
+                    COUNT(l.ownership), COUNT(DISTINCT l.ownership),
+                    TOTAL(e.minted),
+                    MIN(l.positionX), MAX(l.positionX), MIN(l.positionY), MAX(l.positionY),
+                    MAX(e.timestamp)
+                FROM entities_latest l
+                CROSS JOIN entities e
+                ON e."index" = l."index"
+                AND e.iter = l.iter
+            """).fetchone()
+            if not r[0]:
+                return {'entities': 0}
+            return {
+                'entities': r[0],
+                'stacks': r[1],
+                'owned': r[2],
+                'owners': r[3],
+                'minted': int(r[4]),
+                'bounds': list(r[5:9]),
+                'last_timestamp': r[9],
+            }
+        return await self._executor.read(_aggregate)
+
+    @staticmethod
+    def _tile_key(bounds: dict) -> tuple[int, int] | None:
+        '''``(tile_x, tile_y)`` when bounds are exactly one whole tile, else None.'''
+        tx, ty = tile_of(bounds['min_x']), tile_of(bounds['min_y'])
+        whole = (
+            bounds['min_x'] == tx * 8 + 1 and bounds['max_x'] == tx * 8 + 8 and
+            bounds['min_y'] == ty * 8 + 1 and bounds['max_y'] == ty * 8 + 8 and
+            bounds.get('limit', 8*8) >= 8*8
+        )
+        return (tx, ty) if whole else None
+
+    async def latest_at_many(self, points: list[tuple[int, int]]) -> dict[tuple[int, int], dict]:
+        '''
+        Top of the stack (highest iter, pending writes included) for each
+        ``(x, y)`` in ``points``, answered with one query per chunk of
+        ``POINTS_PER_QUERY`` cells. Cells with no entity are absent from
+        the result.
+        '''
+        cells = list(dict.fromkeys(points))
+        if not cells:
+            return {}
+
+        def _fetch(conn: sqlite3.Connection):
+            rows = []
+            for n in range(0, len(cells), POINTS_PER_QUERY):
+                chunk = cells[n:n + POINTS_PER_QUERY]
+                values = ", ".join(["(?, ?)"] * len(chunk))
+                rows.extend(conn.execute(
+                    f"""
+                    WITH pts(x, y) AS (VALUES {values})
+                    SELECT e.*
+                    FROM pts
+                    CROSS JOIN entities_latest l
+                    ON l.positionX = pts.x
+                    AND l.positionY = pts.y
+                    CROSS JOIN entities e
+                    ON e."index" = l."index"
+                    AND e.iter = l.iter
+                    """,
+                    [v for cell in chunk for v in cell]
+                ).fetchall())
+            return rows
+
+        top: dict[tuple[int, int], tuple] = {}
+        for r in [*await self._executor.read(_fetch), *(p for c in cells for p in self._overlay.at(*c))]:
+            cell = (r[6], r[7])
+            if cell not in top or r[1] >= top[cell][1]:
+                top[cell] = r
+
+        return {cell: self._row_to_dict(r) for cell, r in top.items()}
+
     def _row_to_dict(self, row: tuple) -> dict:
-        """Helper to map tuple -> dict and parse JSON."""
+        """Helper to map tuple -> dict and decode aesthetics."""
         # Order: index(0), iter(1), uuid(2), state(3), name(4), description(5), 
         # positionX(6), positionY(7), aesthetics(8), ownership(9), minted(10), timestamp(11)
-        try:
-            # Aesthetics is at index 8 now
-            aes = json.loads(row[8]) if row[8] else {}
-        except json.JSONDecodeError:
-            aes = {} # Fallback
+        # Aesthetics is a packed BLOB, or JSON text for custom / unmigrated rows,
+        # decoded only when read (most rows are cached and served many times)
+        aes = aesthetic_codec.LazyAesthetics(row[8], self.zone)
 
         return {
             "index": row[0],
@@ -523,88 +1296,60 @@ class EntityStore(BaseStore):
             x: int,
             y: int,
             intended_iter: int | None = None,
+            as_of: float | None = None,
         ) -> dict:
         """
         Return all iterations <= intended_iter for all entities at (x, y).
 
         - intended_iter=None → return everything (latest view)
+        - as_of → only versions with timestamp <= as_of (time axis)
         - is_latest_on_file=True iff no iter > intended_iter exists
-        """
 
-        async with self._conn() as conn:
-
-            def _fetch():
-                iter_filter = "AND iter <= ?" if intended_iter is not None else ""
-
-                sql = f"""
-                    SELECT * FROM (
-                        -- Queue rows
-                        SELECT
-                            'queue' AS src,
-                            queue_id,
-                            "index", iter, uuid, state, name, description,
-                            positionX, positionY,
-                            aesthetics, ownership, minted, timestamp
-                        FROM write_queue
-                        WHERE positionX=? AND positionY=?
-                        {iter_filter}
-
-                        UNION ALL
-
-                        -- Persisted rows
-                        SELECT
-                            'table' AS src,
-                            NULL AS queue_id,
-                            "index", iter, uuid, state, name, description,
-                            positionX, positionY,
-                            aesthetics, ownership, minted, timestamp
-                        FROM entities
-                        WHERE positionX=? AND positionY=?
-                        {iter_filter}
-                    )
-                    ORDER BY "index", iter DESC
-                """
-
-                params: list[int] = [x, y]
-                if intended_iter is not None:
-                    params.append(intended_iter)
-
-                params.extend([x, y])
-                if intended_iter is not None:
-                    params.append(intended_iter)
-
-                rows = conn.execute(sql, tuple(params)).fetchall()
-
-                # True max iter on file (ignores intended_iter)
-                max_iter = conn.execute(
-                    """
-                    SELECT MAX(iter)
-                    FROM (
-                        SELECT iter FROM entities
-                        WHERE positionX=? AND positionY=?
-                        UNION ALL
-                        SELECT iter FROM write_queue
-                        WHERE positionX=? AND positionY=?
-                    )
-                    """,
-                    (x, y, x, y)
-                ).fetchone()[0]
-
-                return rows, max_iter
+        Pending (unflushed) rows are merged from the in-memory overlay and
+        take precedence over the persisted version of the same iter. The
+        persisted stack is cached per cell and filtered by intended_iter here.
+        """
 
-            rows, max_iter = await anyio.to_thread.run_sync(_fetch)
+        def _fetch(conn: sqlite3.Connection):
+            rows = conn.execute(
+                "SELECT * FROM entities WHERE positionX=? AND positionY=?",
+                (x, y)
+            ).fetchall()
+
+            # True max iter on file (ignores intended_iter)
+            max_iter = conn.execute(
+                "SELECT MAX(iter) FROM entities_latest WHERE positionX=? AND positionY=?",
+                (x, y)
+            ).fetchone()[0]
+
+            return rows, max_iter
+
+        seed_token = self._versions.token()
+        stack = self._stacks.get((x, y))
+        if stack is None:
+            token = self._stacks.token()
+            stack = await self._executor.read(_fetch)
+            self._stacks.put((x, y), stack, estimate_rows_bytes(stack[0]), token)
+        rows, max_iter = stack
+
+        def wanted(r: tuple) -> bool:
+            return (intended_iter is None or r[1] <= intended_iter) and (as_of is None or r[11] <= as_of)
+
+        merged = {(r[0], r[1]): r for r in rows if wanted(r)}
+        for r in self._overlay.at(x, y):
+            if max_iter is None or r[1] > max_iter:
+                max_iter = r[1]
+            if wanted(r):
+                merged[(r[0], r[1])] = r
 
         entities: list[dict] = []
 
-        for r in rows:
-            data = self._row_to_dict(r[2:])
+        for key in sorted(merged, key=lambda k: (k[0], -k[1])):
+            data = self._row_to_dict(merged[key])
             entities.append(data)
 
-            # Optional: seed LRU cache if you already use one
-            if hasattr(self, "_cache"):
-                cache_key = f"{data['index']}:{data['iter']}"
-                self._cache[cache_key] = data
-                self._cache.move_to_end(cache_key)
+            # Seed the single-version tier (bounded; enters on probation)
+            self._versions.put(key, data, estimate_row_bytes(data), seed_token)
 
         is_latest_on_file = (
             intended_iter is None or
@@ -615,6 +1360,7 @@ class EntityStore(BaseStore):
         return {
             "entities": entities,
             "intended_iter": intended_iter,
+            "as_of": as_of,
             "max_iter_on_file": max_iter,
             "is_latest_on_file": is_latest_on_file,
         }
@@ -624,75 +1370,96 @@ class EntityStore(BaseStore):
     async def set(self, data: dict):
         '''
         Upsert a specific version (index + iter).
+
+        The row is journaled and placed in the pending overlay; re-setting a
+        version that has not been flushed yet replaces it in place. Never
+        flushes inline: a full queue wakes the flusher, and past
+        ``QUEUE_HIGH_WATER`` the write is refused (see ``admit``).
         '''
-        # Update the Cache. Key: "index:iter"
-        idx = data['index']
-        iteration = data['iter']
-        cache_key = f"{idx}:{iteration}"
-
-        if cache_key in self._cache:
-            self._cache.move_to_end(cache_key)
-        self._cache[cache_key] = data
-        if len(self._cache) > LRU_CACHE_SIZE:
-            self._cache.popitem(last=False)
-        
-        # Serialize JSON fields to DB
+        self.admit()
+
+        # Pack aesthetics to palette indices (JSON text if it has custom values)
         db_row = data.copy()
-        if isinstance(db_row.get('aesthetics'), (dict, list)):
-            db_row['aesthetics'] = json.dumps(db_row['aesthetics'])
+        db_row['aesthetics'] = aesthetic_codec.encode(db_row.get('aesthetics'), self.zone)
 
-        # Enqueue - UPDATED placeholders to 12
-        async with self._conn() as conn:
-            await anyio.to_thread.run_sync(
-                conn.execute,
-                """
-                INSERT INTO write_queue (
-                    "index", iter, uuid, state, name, description,
-                    positionX, positionY,
-                    aesthetics, ownership, minted, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    db_row['index'], db_row['iter'], db_row['uuid'], db_row['state'], db_row['name'], db_row['description'],
-                    db_row['positionX'], db_row['positionY'],
-                    db_row['aesthetics'], db_row['ownership'], int(db_row['minted']), db_row['timestamp']
-                )
-            )
+        row = (
+            db_row['index'], db_row['iter'], db_row['uuid'], db_row['state'], db_row['name'], db_row['description'],
+            db_row['positionX'], db_row['positionY'],
+            db_row['aesthetics'], db_row['ownership'], int(db_row['minted']), db_row['timestamp']
+        )
+
+        # Journal before acknowledging, then expose to readers
+        self._journal.append(row)
+        self._overlay.put(row)
+        self._tiles.invalidate((tile_of(row[6]), tile_of(row[7])))
+
+        # Update the Cache. Key: (index, iter)
+        cached = self._row_to_dict(row)
+        self._versions.invalidate((row[0], row[1]))
+        self._versions.put((row[0], row[1]), cached, estimate_row_bytes(cached))
 
         self.writes += 1
-        self.queue_depth += 1
-        # Normal flush threshold
+        self.queue_depth = len(self._overlay)
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
         if self.queue_depth >= MAX_QUEUE_ROWS:
-            await self._flush()
+            self._wake_flusher()
 
-        # Hard backpressure cap (safety valve)
-        elif self.queue_depth > MAX_QUEUE_ROWS * 10:
-            logger.warning(
-                f"Write queue overloaded ({self.queue_depth}), forcing flush"
-            )
-            await self._flush(force=True)
+    def admit(self):
+        '''
+        Raise ``WriteRejected`` if this zone should not take another write
+        now: 503 while it is closed or its last flush failed, 429 once
+        ``QUEUE_HIGH_WATER`` rows are pending. ``retry_after`` estimates when
+        the queue will be back under ``MAX_QUEUE_ROWS`` at the recent drain
+        rate.
+        '''
+        if not self._running:
+            raise WriteRejected(self.zone, 503, 'closed', self.queue_depth, 1)
+        if self.flush_failing:
+            # However short the queue, a zone that cannot commit must not take more
+            self.rejected += 1
+            raise WriteRejected(self.zone, 503, 'flush_failing', self.queue_depth, math.ceil(FLUSH_INTERVAL) * 5)
+        if self.queue_depth < QUEUE_HIGH_WATER:
+            return
+        self.rejected += 1
+        self._wake_flusher()
+        backlog = self.queue_depth - MAX_QUEUE_ROWS
+        wait = backlog / self.drain_rate if self.drain_rate > 0 else FLUSH_INTERVAL
+        raise WriteRejected(self.zone, 429, 'queue_full', self.queue_depth, min(30, max(1, math.ceil(wait))))
+
+    def _wake_flusher(self):
+        if self.scheduler is not None:
+            self.scheduler.wake()
+        else:
+            self._flush_wanted.set()
 
     async def get(self, index: int, iteration: Optional[int] = None) -> Optional[dict]:
         '''
         If iteration is None: Returns the LATEST (highest iter) version.
         If iteration is set: Returns that specific version.
         '''
-        cache_key = f"{index}:{iteration}" if iteration is not None else None
-
         # 1. Cache Hit
-        if cache_key and cache_key in self._cache:
-            self._cache.move_to_end(cache_key)
-            self.cache_hits += 1
-            return self._cache[cache_key]
+        if iteration is not None:
+            cached = self._versions.get((index, iteration))
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
         
         self.cache_misses += 1
+        token = self._versions.token()
+
+        # 2. Pending overlay (newest version)
+        pending = (
+            self._overlay.get(index, iteration)
+            if iteration is not None else
+            self._overlay.latest(index)
+        )
+        if pending:
+            result = self._row_to_dict(pending)
 
-        # DB (Check Queue then Table)
-        async with self._conn() as conn:
-            def _fetch():
-                query_suffix = ""
-                params = []
-                
+        # 3. Main table
+        else:
+            def _fetch(conn: sqlite3.Connection):
                 if iteration is not None:
                     query_suffix = "WHERE \"index\"=? AND iter=?"
                     params = (index, iteration)
@@ -701,110 +1468,278 @@ class EntityStore(BaseStore):
                     query_suffix = "WHERE \"index\"=? ORDER BY iter DESC LIMIT 1"
                     params = (index,)
 
-                # Check Queue First (newest version)
-                cur = conn.execute(f"SELECT * FROM write_queue {query_suffix}", params)
-                row = cur.fetchone()
-                if row:
-                    # Queue table has 'queue_id' at index 0, real data starts at 1
-                    return self._row_to_dict(row[1:])
-                
-                # Check Main Table
-                cur = conn.execute(f"SELECT * FROM entities {query_suffix}", params)
-                row = cur.fetchone()
+                row = conn.execute(f"SELECT * FROM entities {query_suffix}", params).fetchone()
                 return self._row_to_dict(row) if row else None
             
-            result = await anyio.to_thread.run_sync(_fetch)
+            result = await self._executor.read(_fetch)
 
         if result:
             # Cache the specific version found
-            found_key = f"{result['index']}:{result['iter']}"
-            self._cache[found_key] = result
+            found_key = (result['index'], result['iter'])
+            self._versions.put(found_key, result, estimate_row_bytes(result), token)
         return result
 
     # Background Flush ──────────────────────────
+    async def _migrate_aesthetics(self):
+        '''
+        Online migration: repack JSON ``aesthetics`` rows into palette BLOBs in
+        small writer jobs, so flushes and index allocation interleave freely.
+        Batches are found on a reader; the writer only applies them. Rows
+        with custom values stay JSON. Decoded caches stay valid, since both
+        encodings decode to the same dict. A completed pass is recorded in
+        the zone file's ``user_version`` and never repeated: new writes are
+        packed in ``set`` and recovered pending rows in ``init``.
+        '''
+        after = 0
+        try:
+            version = await self._executor.read(lambda conn: conn.execute("PRAGMA user_version").fetchone()[0])
+            if version >= AESTHETICS_MIGRATED:
+                return
+            while self._running:
+                after, updates = await self._executor.read(self._read_aesthetics_batch, after)
+                if updates:
+                    self.aesthetics_packed += await self._executor.write(self._repack_aesthetics, updates)
+                if after is None:
+                    await self._executor.write(lambda conn: conn.execute(f"PRAGMA user_version = {AESTHETICS_MIGRATED}"))
+                    break
+                await asyncio.sleep(AESTHETICS_MIGRATE_PAUSE)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.error(f"Aesthetics migration error: {e}")
+            return
+        if self.aesthetics_packed:
+            logger.info(f"Packed {self.aesthetics_packed} aesthetics rows in {self.name}")
+
+    def _read_aesthetics_batch(self, conn: sqlite3.Connection, after: int) -> tuple[int | None, list[tuple]]:
+        '''
+        The next migration batch after rowid ``after``, read without the write
+        lock: ``(cursor, [(packed, rowid, text), ...])``, cursor ``None`` when
+        the scan is done.
+        '''
+        rows = conn.execute("""
+            SELECT rowid, aesthetics FROM entities
+            WHERE rowid > ? AND typeof(aesthetics) = 'text'
+            ORDER BY rowid
+            LIMIT ?
+        """, (after, AESTHETICS_MIGRATE_BATCH)).fetchall()
+        updates = [(packed, rowid, text) for rowid, text in rows if (packed := aesthetic_codec.pack(text, self.zone))]
+        return (rows[-1][0] if rows else None), updates
+
+    @staticmethod
+    def _repack_aesthetics(conn: sqlite3.Connection, updates: list[tuple]) -> int:
+        '''Apply one batch; a row rewritten since it was read no longer matches its text and is skipped.'''
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.executemany("UPDATE entities SET aesthetics = ? WHERE rowid = ? AND aesthetics = ?", updates)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    async def _snapshot_columns(self):
+        '''Write the columnar view to ``zone{i}.columns/`` if it changed since the last snapshot.'''
+        if self._columns is None or self._columns.version == self._snapshot_version:
+            return
+        arrays, meta = self._columns.export()
+        await anyio.to_thread.run_sync(write_snapshot, self._columns_dir, arrays, {**meta, 'zone': self.zone})
+        self._snapshot_version = meta['version']
+        self._snapshot_at = time.monotonic()
+
     async def _flush_loop(self):
         while self._running:
             try:
-                await asyncio.sleep(FLUSH_INTERVAL)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._flush_wanted.wait(), FLUSH_INTERVAL)
+                self._flush_wanted.clear()
                 if self.queue_depth > 0:
-                    await self._flush()
+                    if self.scheduler is None:  # standalone store; db_server flushes through the FlushScheduler
+                        await self._flush()
+                        if self.rows_since_checkpoint >= CHECKPOINT_ROWS:
+                            await self.checkpoint()
+                elif IDLE_RELEASE > 0 and not self.keep_open:
+                    await self._executor.release(IDLE_RELEASE)  # reopened by the next query
+                if COLUMNAR_SNAPSHOT_INTERVAL > 0 and time.monotonic() - self._snapshot_at >= COLUMNAR_SNAPSHOT_INTERVAL:
+                    await self._snapshot_columns()
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Flush loop error: {e}")
 
-    async def _flush(self, force: bool = False):
+    def _commit_rows(self, conn: sqlite3.Connection, rows: list[tuple]):
+        '''Write one batch of pending rows and every derived index in a single transaction.'''
+        cells = {(d[6], d[7]) for d in rows}
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = pyramid.cell_states(conn, cells)
+
+            conn.executemany("""
+                INSERT OR REPLACE INTO entities (
+                    "index", iter, uuid, state, name, description,
+                    positionX, positionY,
+                    aesthetics, ownership, minted, timestamp
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+            # Keep the spatial index in sync (one box per index)
+            conn.executemany("""
+                INSERT OR IGNORE INTO entities_rtree (id, minX, maxX, minY, maxY)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(d[0], d[6], d[6], d[7], d[7]) for d in rows])
+
+            # Advance the latest-iteration pointer per index
+            conn.executemany("""
+                INSERT INTO entities_latest (
+                    "index", iter, uuid, ownership, positionX, positionY
+                ) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT("index") DO UPDATE SET
+                    iter      = excluded.iter,
+                    uuid      = excluded.uuid,
+                    ownership = excluded.ownership,
+                    positionX = excluded.positionX,
+                    positionY = excluded.positionY
+                WHERE excluded.iter >= entities_latest.iter
+            """, [(d[0], d[1], d[2], d[9], d[6], d[7]) for d in rows])
+
+            self._update_inventory(conn, {d[2] for d in rows if d[2] is not None})
+            pyramid.apply(conn, before, pyramid.cell_states(conn, cells))
+
+            # Re-index the text of whatever is now latest for the touched indices
+            touched = [(i,) for i in {d[0] for d in rows}]
+            conn.executemany("DELETE FROM entities_fts WHERE rowid = ?", touched)
+            conn.executemany("""
+                INSERT INTO entities_fts (rowid, name, description)
+                SELECT e."index", e.name, e.description
+                FROM entities_latest l
+                CROSS JOIN entities e
+                ON e."index" = l."index"
+                AND e.iter = l.iter
+                WHERE l."index" = ?
+            """, touched)
+
+            conn.execute("COMMIT")
+
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Flush failed: {e}")
+            raise
+
+    @staticmethod
+    def _update_inventory(conn: sqlite3.Connection, uuids: "set[str]"):  # quoted: `set` is a method here
+        '''Recompute ``owner_inventory`` for the touched stacks and apply the count deltas to ``owner_totals``.'''
+        delta: dict[str, int] = {}
+        for u in uuids:
+            for (owner,) in conn.execute("SELECT ownership FROM owner_inventory WHERE uuid = ?", (u,)):
+                delta[owner] = delta.get(owner, 0) - 1
+            conn.execute("DELETE FROM owner_inventory WHERE uuid = ?", (u,))
+            conn.execute("""
+                INSERT INTO owner_inventory (uuid, ownership, "index", iter)
+                SELECT uuid, ownership, "index", MAX(iter)
+                FROM entities_latest
+                WHERE uuid = ? AND ownership IS NOT NULL
+                GROUP BY ownership
+            """, (u,))
+            for (owner,) in conn.execute("SELECT ownership FROM owner_inventory WHERE uuid = ?", (u,)):
+                delta[owner] = delta.get(owner, 0) + 1
+
+        changed = [(owner, d) for owner, d in delta.items() if d]
+        conn.executemany("""
+            INSERT INTO owner_totals (ownership, stacks) VALUES (?, ?)
+            ON CONFLICT(ownership) DO UPDATE SET stacks = stacks + excluded.stacks
+        """, changed)
+        conn.executemany("DELETE FROM owner_totals WHERE ownership = ? AND stacks <= 0", [(o,) for o, _ in changed])
+
+    async def flush(self, limit: int) -> int:
+        '''Commit up to ``limit`` pending rows in one transaction; returns the rows flushed.'''
+        return await self._flush(limit=limit)
+
+    async def checkpoint(self) -> tuple[int, int, int]:
+        '''Passive WAL checkpoint on the writer: ``(busy, wal_pages, checkpointed_pages)``.'''
+        self.rows_since_checkpoint = 0
+        return await self._executor.write(lambda conn: conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone())
+
+    async def _flush(self, force: bool = False, limit: int | None = None) -> int:
         async with self._write_lock:
-            async with self._conn() as conn:
-
-                def _do_flush():
-                    # Dynamic batch sizing
-                    if force:
-                        batch_limit = MAX_QUEUE_ROWS * 10
-                    else:
-                        batch_limit = MAX_QUEUE_ROWS * 2
-
-                    total_flushed = 0
-
-                    while True:
-                        rows = conn.execute(
-                            "SELECT * FROM write_queue ORDER BY queue_id LIMIT ?",
-                            (batch_limit,)
-                        ).fetchall()
-
-                        if not rows:
-                            break
-
-                        conn.execute("BEGIN IMMEDIATE")
-                        try:
-                            data_tuples = [r[1:] for r in rows]  # strip queue_id
-
-                            conn.executemany("""
-                                INSERT OR REPLACE INTO entities (
-                                    "index", iter, uuid, state, name, description,
-                                    positionX, positionY,
-                                    aesthetics, ownership, minted, timestamp
-                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            """, data_tuples)
-
-                            ids = [(r[0],) for r in rows]
-                            conn.executemany(
-                                "DELETE FROM write_queue WHERE queue_id=?",
-                                ids
-                            )
-
-                            conn.execute("COMMIT")
-                            total_flushed += len(rows)
-
-                            # WAL hygiene
-                            if self.flushes % 20 == 0:
-                                conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
-
-                            # Normal flush exits after one batch
-                            if not force:
-                                break
-
-                            # If force flushing but we didn't fill the batch,
-                            # the queue is effectively drained
-                            if len(rows) < batch_limit:
-                                break
-
-                        except Exception as e:
-                            conn.execute("ROLLBACK")
-                            logger.error(f"Flush failed: {e}")
-                            raise
-
-                    return total_flushed
-
-                flushed = await anyio.to_thread.run_sync(_do_flush)
-
-                if flushed > 0:
-                    self.flushes += 1
-                    self.queue_depth = conn.execute(
-                        "SELECT COUNT(*) FROM write_queue"
-                    ).fetchone()[0]
-
-                    if force:
-                        logger.warning(
-                            f"Forced flush completed, flushed={flushed}, remaining={self.queue_depth}"
-                        )
+            # Dynamic batch sizing
+            if limit is not None:
+                batch_limit = limit
+            elif force:
+                batch_limit = MAX_QUEUE_ROWS * 10
+            else:
+                batch_limit = MAX_QUEUE_ROWS * 2
+
+            flushed = 0
+
+            while True:
+                rows = self._overlay.rows(batch_limit)
+
+                if not rows:
+                    break
+
+                started = time.perf_counter()
+                try:
+                    await self._executor.write(self._commit_rows, rows)
+                except Exception:
+                    self.flush_failing = True
+                    raise
+                self.flush_failing = False
+                rate = len(rows) / max(time.perf_counter() - started, 1e-6)
+                self.drain_rate = rate if not self.drain_rate else self.drain_rate + 0.2 * (rate - self.drain_rate)
+
+                # Committed: drop from the overlay and seal the journal
+                # (no await between the two, so no set() can interleave)
+                self._overlay.discard(rows)
+                sealed = self._journal.seal()
+                pending = self._overlay.rows()
+
+                # range_query and cached stacks read `entities` only, so they change on commit
+                touched: dict[tuple[int, int], set[tuple[int, int]]] = {}
+                for r in rows:
+                    touched.setdefault((tile_of(r[6]), tile_of(r[7])), set()).add((r[6], r[7]))
+                if touched:
+                    self._tile_clock += 1
+                for tile, cells in touched.items():
+                    self._tiles.invalidate(tile)
+                    _, tracked_since, marks = self._tile_versions.pop(tile, (None, self._tile_floor, {}))
+                    marks.update(dict.fromkeys(cells, self._tile_clock))  # at most 64 cells per tile
+                    self._tile_versions[tile] = (self._tile_clock, tracked_since, marks)
+                while len(self._tile_versions) > TILE_VERSIONS_MAX:
+                    _, (dropped, _, _) = self._tile_versions.popitem(last=False)
+                    self._tile_floor = max(self._tile_floor, dropped)
+                for cell in {(r[6], r[7]) for r in rows}:
+                    self._stacks.invalidate(cell)
+                if self._columns is not None:
+                    self._columns.update(rows)
+                flushed += len(rows)
+
+                # Compact off the event loop; appends continue in the new live file.
+                # A failed compaction leaves its segments for the next one.
+                try:
+                    await self._executor.write(lambda conn: self._journal.compact(pending, sealed))
+                except Exception as e:
+                    logger.error(f"Journal compaction of {self.name} failed: {e}")
+
+                # Normal flush exits after one batch
+                if not force:
+                    break
+
+                # If force flushing but we didn't fill the batch,
+                # the queue is effectively drained
+                if len(rows) < batch_limit:
+                    break
+
+            if flushed > 0:
+                self.flushes += 1
+                self.rows_since_checkpoint += flushed
+                self.queue_depth = len(self._overlay)
+                if not self.queue_depth:
+                    self.pending_since = None
+
+                if force:
+                    logger.warning(
+                        f"Forced flush completed, flushed={flushed}, remaining={self.queue_depth}"
+                    )
+
+            return flushed
@@ -0,0 +1,179 @@
+import os
+import json as _json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import httpx
+
+logger = logging.getLogger("fe")
+
+DB_POOL_CONNECTIONS = int(os.getenv("DB_POOL_CONNECTIONS", 64))       # connections to db_server, at most
+DB_POOL_KEEPALIVE   = int(os.getenv("DB_POOL_KEEPALIVE", 32))         # idle connections kept for reuse
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", 30.0))   # seconds an idle connection is kept
+DB_CONNECT_TIMEOUT  = float(os.getenv("DB_CONNECT_TIMEOUT", 2.0))
+DB_POOL_TIMEOUT     = float(os.getenv("DB_POOL_TIMEOUT", 5.0))        # seconds to wait for a free connection
+DB_HTTP2            = os.getenv("DB_HTTP2", "0") == "1"               # needs the `h2` package and an HTTP/2 front for db_server
+DB_UDS              = os.getenv("DB_UDS") or None                     # reach db_server (or db_router) over its unix socket
+
+def route_timeout(read: float | None) -> httpx.Timeout:
+    return httpx.Timeout(DB_CONNECT_TIMEOUT, read=read, write=DB_CONNECT_TIMEOUT + 3.0, pool=DB_POOL_TIMEOUT)
+
+DB_TIMEOUT        = float(os.getenv("DB_TIMEOUT", 5.0))         # read budget of a single-zone request
+DB_TIMEOUT_HEAVY  = float(os.getenv("DB_TIMEOUT_HEAVY", 10.0))  # requests that read every zone or large payloads
+
+# Read budget per db_server route (first path segment); anything else gets DB_TIMEOUT
+ROUTE_TIMEOUTS = {
+    'ownership':    route_timeout(DB_TIMEOUT_HEAVY),
+    'expandmany':   route_timeout(DB_TIMEOUT_HEAVY),
+    'search':       route_timeout(DB_TIMEOUT_HEAVY),
+    'owner_totals': route_timeout(DB_TIMEOUT_HEAVY),
+    'timeline':     route_timeout(None),  # streamed; rows arrive as they are read
+    'export':       route_timeout(None),
+}
+
+class DBClient:
+    '''
+    The HTTP client fe_server uses for every db_server request. It is opened
+    in the lifespan hook and shared by all routes, so requests reuse pooled
+    keep-alive connections (HTTP/2 with ``DB_HTTP2=1``) instead of opening
+    one per request. Each request gets the read timeout of its db route
+    from ``ROUTE_TIMEOUTS``, and connects are timed through httpcore's trace
+    hook for ``metrics``.
+    '''
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+        self.http2 = False
+        self._transport: httpx.AsyncHTTPTransport | None = None
+        self.requests = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_ms_total = 0.0
+        self.connect_ms_max = 0.0
+        self.active_peak = 0
+
+        # Single-flight reads: key -> in-flight request, and how many callers wait on it
+        self._flights: dict[tuple[str, str], asyncio.Task] = {}
+        self._waiters: dict[tuple[str, str], int] = {}
+        self.shared = {}  # route -> [requests, coalesced]
+        self.waiters_max = 0
+
+    async def start(self):
+        if self.client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=DB_POOL_CONNECTIONS,
+            max_keepalive_connections=DB_POOL_KEEPALIVE,
+            keepalive_expiry=DB_KEEPALIVE_EXPIRY
+        )
+        try:
+            self._transport = httpx.AsyncHTTPTransport(limits=limits, http2=DB_HTTP2, uds=DB_UDS, retries=1)
+            self.http2 = DB_HTTP2
+        except ImportError:
+            logger.warning("DB_HTTP2=1 but the h2 package is not installed; using HTTP/1.1")
+            self._transport = httpx.AsyncHTTPTransport(limits=limits, uds=DB_UDS, retries=1)
+        self.client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=route_timeout(DB_TIMEOUT),
+            event_hooks={'request': [self._on_request]}
+        )
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+        self.client = self._transport = None
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[httpx.AsyncClient]:
+        '''The shared client, as a drop-in for ``async with httpx.AsyncClient() as client`` (not closed on exit).'''
+        if self.client is None:
+            await self.start()
+        yield self.client
+
+    async def shared_post(self, url: str, json: Any = None, **kwargs) -> httpx.Response:
+        '''
+        POST for idempotent reads: concurrent calls with the same ``url`` and
+        ``json`` body share one upstream request and all receive its
+        response (or its exception). A caller that goes away does not cancel
+        the request for the others. Never use it for writes, or for reads
+        that must see a write made after the shared request started.
+        '''
+        key = (url, _json.dumps(json, sort_keys=True, default=str))
+        stats = self.shared.setdefault(httpx.URL(url).path.split('/')[1], [0, 0])
+        stats[0] += 1
+
+        flight = self._flights.get(key)
+        if flight is None:
+            if self.client is None:
+                await self.start()
+            flight = asyncio.ensure_future(self.client.post(url, json=json, **kwargs))
+            self._flights[key] = flight
+            self._waiters[key] = 0
+            flight.add_done_callback(lambda _: (self._flights.pop(key, None), self._waiters.pop(key, None)))
+        else:
+            stats[1] += 1
+            self._waiters[key] += 1
+            self.waiters_max = max(self.waiters_max, self._waiters[key])
+        return await asyncio.shield(flight)
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests += 1
+        self.active_peak = max(self.active_peak, self._pool_counts()[1] + 1)
+        route = request.url.path.split('/')[1]  # '/set/3' -> 'set'
+        request.extensions['timeout'] = ROUTE_TIMEOUTS.get(route, self.client.timeout).as_dict()
+
+        started = None
+        async def trace(event: str, info: dict):
+            nonlocal started
+            if not event.startswith(("connection.connect_tcp.", "connection.connect_unix_socket.")):
+                return
+            if event.endswith(".started"):
+                started = time.perf_counter()
+            elif event.endswith(".failed"):
+                self.connect_failures += 1
+            elif event.endswith(".complete") and started is not None:
+                ms = (time.perf_counter() - started) * 1000
+                self.connects += 1
+                self.connect_ms_total += ms
+                self.connect_ms_max = max(self.connect_ms_max, ms)
+        request.extensions['trace'] = trace
+
+    def _pool_counts(self) -> tuple[int, int]:
+        '''``(open, active)`` connections in the transport's pool.'''
+        pool = getattr(self._transport, '_pool', None)
+        if pool is None:
+            return 0, 0
+        conns = [c for c in pool.connections if not c.is_closed()]
+        return len(conns), sum(not c.is_idle() for c in conns)
+
+    @property
+    def metrics(self) -> dict:
+        opened, active = self._pool_counts()
+        return {
+            'http2': self.http2,
+            'uds': DB_UDS is not None,
+            'max_connections': DB_POOL_CONNECTIONS,
+            'max_keepalive': DB_POOL_KEEPALIVE,
+            'connections': opened,
+            'active': active,
+            'idle': opened - active,
+            'saturation': round(active / DB_POOL_CONNECTIONS, 3),
+            'saturation_peak': round(self.active_peak / DB_POOL_CONNECTIONS, 3),
+            'requests': self.requests,
+            'connects': self.connects,
+            'connect_failures': self.connect_failures,
+            'reuse': round(1 - self.connects / self.requests, 3) if self.requests else None,
+            'connect_ms_avg': round(self.connect_ms_total / self.connects, 3) if self.connects else None,
+            'connect_ms_max': round(self.connect_ms_max, 3),
+            'single_flight': {
+                'in_flight': len(self._flights),
+                'waiting': sum(self._waiters.values()),
+                'waiters_max': self.waiters_max,
+                'routes': {
+                    route: {'requests': n, 'coalesced': dup, 'dedupe_ratio': round(dup / n, 3)}
+                    for route, (n, dup) in self.shared.items()
+                }
+            }
+        }
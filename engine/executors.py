@@ -0,0 +1,221 @@
+import time
+import queue
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable
+
+import anyio
+
+logger = logging.getLogger("db")
+
+Job = Callable[..., Any]  # fn(conn, *args) -> result
+
+def _resolve(fut: asyncio.Future, result: Any, error: BaseException | None):
+    if fut.done():  # awaiting request was cancelled
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+class _Lane:
+    '''
+    A fixed set of threads draining one job queue. Each thread opens its own
+    connection on start and keeps it for its whole life, so a connection is
+    only ever touched by the thread that created it.
+
+    ``stop`` hands the running threads their own queue to drain, so a lane
+    can be started again right away (even while the old threads finish).
+    '''
+    def __init__(
+            self,
+            name: str,
+            threads: int,
+            connect: Callable[[], sqlite3.Connection]
+        ):
+
+        self.name = name
+        self.size = max(1, threads)
+        self._connect = connect
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._threads: list[threading.Thread] = []
+
+        # Metrics (guarded by _stats_lock, written from worker threads)
+        self._stats_lock = threading.Lock()
+        self.jobs = 0
+        self.inflight = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.busy_total = 0.0
+
+    def start(self):
+        self._queue = queue.SimpleQueue()
+        for n in range(self.size):
+            t = threading.Thread(target=self._run, args=(self._queue,), name=f"{self.name}-{n}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn: Job, *args) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._stats_lock:
+            self.inflight += 1
+        self._queue.put((fn, args, loop, fut, time.perf_counter()))
+        return fut
+
+    def detach(self) -> Callable[[], None]:
+        '''Stop taking jobs; returns a blocking ``join`` that lets queued jobs finish first.'''
+        threads, jobs = self._threads, self._queue
+        self._threads = []
+        self._queue = queue.SimpleQueue()
+        for _ in threads:
+            jobs.put(None)
+
+        def join():
+            for t in threads:
+                t.join()
+        return join
+
+    def stop(self):
+        self.detach()()
+
+    def _run(self, jobs: queue.SimpleQueue):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            # Fail every job instead of leaving callers awaiting forever
+            logger.error(f"{threading.current_thread().name}: cannot open connection: {e}")
+            conn, failure = None, e
+        else:
+            failure = None
+
+        try:
+            while True:
+                job = jobs.get()
+                if job is None:
+                    break
+
+                fn, args, loop, fut, queued = job
+                started = time.perf_counter()
+                result, error = None, failure
+                if failure is None:
+                    try:
+                        result = fn(conn, *args)
+                    except BaseException as e:
+                        error = e
+                finished = time.perf_counter()
+
+                with self._stats_lock:
+                    waited = started - queued
+                    self.jobs += 1
+                    self.inflight -= 1
+                    self.wait_total += waited
+                    self.wait_max = max(self.wait_max, waited)
+                    self.busy_total += finished - started
+
+                loop.call_soon_threadsafe(_resolve, fut, result, error)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @property
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            return {
+                'threads': self.size,
+                'jobs': self.jobs,
+                'queued': self.inflight,
+                'queue_wait_ms_avg': round(self.wait_total / self.jobs * 1000, 3) if self.jobs else 0.0,
+                'queue_wait_ms_max': round(self.wait_max * 1000, 3),
+                'busy_ms_avg': round(self.busy_total / self.jobs * 1000, 3) if self.jobs else 0.0,
+            }
+
+class ZoneExecutor:
+    '''
+    Per-zone execution model: one writer thread owning the only connection
+    that writes (flushes, index allocation), plus a small pool of reader
+    threads with their own pinned connections. Zones never share threads,
+    so a busy zone queues behind itself instead of starving the others.
+
+    Threads and connections are opened on the first job and can be given
+    back with ``release`` when the zone goes idle; the next job reopens them.
+
+    >>> await executor.read(lambda conn: conn.execute(...).fetchall())
+    '''
+    def __init__(
+            self,
+            name: str,
+            connect: Callable[[], sqlite3.Connection],
+            readers: int,
+            setup: Callable[[sqlite3.Connection], None] | None = None
+        ):
+
+        self.name = name
+        self._writer = _Lane(f"{name}-writer", 1, self._with_setup(connect, setup, once=True))
+        self._readers = _Lane(f"{name}-reader", readers, connect)
+        self.running = False
+        self.last_used = time.monotonic()
+        self.releases = 0
+
+    @staticmethod
+    def _with_setup(connect, setup, once: bool = False):
+        done = False
+        def _connect():
+            nonlocal done
+            conn = connect()
+            if setup is not None and not (once and done):
+                setup(conn)
+                done = True
+            return conn
+        return _connect
+
+    def start(self):
+        if self.running:
+            return
+        self._writer.start()
+        self._readers.start()
+        self.running = True
+
+    async def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        # Detach both lanes before waiting, so a job submitted meanwhile starts fresh threads
+        joins = (self._writer.detach(), self._readers.detach())
+        for join in joins:
+            await anyio.to_thread.run_sync(join)
+
+    async def release(self, idle: float) -> bool:
+        '''Close every connection if no job was submitted for ``idle`` seconds.'''
+        if not self.running or time.monotonic() - self.last_used < idle:
+            return False
+        if self._writer.inflight or self._readers.inflight:
+            return False
+        await self.stop()
+        self.releases += 1
+        logger.info(f"Released idle connections of {self.name}")
+        return True
+
+    def _use(self):
+        self.last_used = time.monotonic()
+        if not self.running:
+            self.start()
+
+    def write(self, fn: Job, *args) -> asyncio.Future:
+        self._use()
+        return self._writer.submit(fn, *args)
+
+    def read(self, fn: Job, *args) -> asyncio.Future:
+        self._use()
+        return self._readers.submit(fn, *args)
+
+    @property
+    def metrics(self) -> dict:
+        return {
+            'connected': self.running,
+            'releases': self.releases,
+            'writer': self._writer.metrics,
+            'readers': self._readers.metrics,
+        }
@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any
+
+from .databases import FLUSH_INTERVAL, MAX_QUEUE_ROWS, CHECKPOINT_ROWS
+
+logger = logging.getLogger("db")
+
+FLUSH_TICK         = float(os.getenv("FLUSH_TICK", 0.05))        # seconds between scheduling decisions
+FLUSH_CONCURRENCY  = int(os.getenv("FLUSH_CONCURRENCY", 2))      # zones committing at the same time
+FLUSH_MAX_BATCH    = int(os.getenv("FLUSH_MAX_BATCH", 5000))     # rows per commit (group commit cap)
+CHECKPOINT_SPACING = float(os.getenv("CHECKPOINT_SPACING", 1.0)) # min seconds between two checkpoints, any zone
+FLUSH_BACKOFF      = float(os.getenv("FLUSH_BACKOFF", 0.5))      # seconds before retrying a failed flush, doubled per failure
+FLUSH_BACKOFF_MAX  = float(os.getenv("FLUSH_BACKOFF_MAX", 30.0)) # cap of the retry delay
+
+RATE_SMOOTHING = 0.2  # EWMA weight of the newest write-rate / latency sample
+
+class _ZoneFlushState:
+    def __init__(self):
+        self.rate = 0.0             # rows/s, smoothed
+        self.seen_writes = 0
+        self.seen_at = time.monotonic()
+        self.flushes = 0
+        self.rows = 0
+        self.latency_ms = 0.0       # smoothed commit latency
+        self.latency_ms_max = 0.0
+        self.lag_ms = 0.0           # age of the oldest pending row when its flush started
+        self.lag_ms_max = 0.0
+        self.checkpoints = 0
+        self.checkpoint_ms = 0.0
+        self.errors = 0
+        self.failing = 0            # consecutive failed flushes
+        self.retry_at = 0.0         # no flush before this (monotonic), while failing
+        self.last_error = None
+
+class FlushScheduler:
+    '''
+    One flush loop for every zone in the process, replacing the per-store
+    fixed-interval loops.
+
+    A zone is flushed when its oldest pending row is ``FLUSH_INTERVAL`` old
+    or when ``MAX_QUEUE_ROWS`` are pending, whichever comes first, so busy
+    zones commit more often and quiet zones wait. A zone whose flush fails
+    is retried after ``FLUSH_BACKOFF`` seconds, doubling per consecutive
+    failure up to ``FLUSH_BACKOFF_MAX``. Each flush drains the
+    whole queue in one transaction (up to ``FLUSH_MAX_BATCH`` rows, and at
+    least the rows expected in one interval at the current write rate).
+    At most ``FLUSH_CONCURRENCY`` zones commit at once, the most lagging
+    first. WAL checkpoints run one zone at a time, at most one per
+    ``CHECKPOINT_SPACING`` seconds, for zones that have written
+    ``CHECKPOINT_ROWS`` rows since their last one.
+    '''
+    def __init__(self, zones: dict[int, Any]):
+        self.zones = zones
+        self.state = {z: _ZoneFlushState() for z in zones}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._flushing: dict[int, asyncio.Task] = {}
+        self._checkpointing: asyncio.Task | None = None
+        self._last_checkpoint = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        for store in self.zones.values():
+            store.scheduler = self
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        '''Stop scheduling; in-flight flushes finish (stores drain the rest on close).'''
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.gather(*self._flushing.values(), *filter(None, [self._checkpointing]), return_exceptions=True)
+        for store in self.zones.values():
+            store.scheduler = None
+
+    def wake(self):
+        '''Called by a store when its queue crosses ``MAX_QUEUE_ROWS``.'''
+        self._wake.set()
+
+    # Scheduling ───────────────────────────
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), FLUSH_TICK)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                self._schedule(time.monotonic())
+            except Exception as e:
+                logger.error(f"Flush scheduler error: {e}")
+
+    def _sample(self, z: int, store, now: float):
+        s = self.state[z]
+        elapsed = now - s.seen_at
+        if elapsed >= 0.5:
+            rate = (store.writes - s.seen_writes) / elapsed
+            s.rate += RATE_SMOOTHING * (rate - s.rate)
+            s.seen_writes, s.seen_at = store.writes, now
+
+    def _schedule(self, now: float):
+        due = []
+        for z, store in self.zones.items():
+            self._sample(z, store, now)
+            if z in self._flushing or not store.queue_depth or now < self.state[z].retry_at:
+                continue
+            age = now - store.pending_since if store.pending_since is not None else 0.0
+            if age >= FLUSH_INTERVAL or store.queue_depth >= MAX_QUEUE_ROWS:
+                due.append((age, z))
+
+        for age, z in sorted(due, reverse=True):
+            if len(self._flushing) >= FLUSH_CONCURRENCY:
+                break
+            self._flushing[z] = asyncio.create_task(self._flush(z, age))
+
+        if self._checkpointing is None and now - self._last_checkpoint >= CHECKPOINT_SPACING:
+            ready = [
+                (store.rows_since_checkpoint, z) for z, store in self.zones.items()
+                if z not in self._flushing and store.rows_since_checkpoint >= CHECKPOINT_ROWS
+            ]
+            if ready:
+                self._last_checkpoint = now
+                self._checkpointing = asyncio.create_task(self._checkpoint(max(ready)[1]))
+
+    async def _flush(self, z: int, age: float):
+        store, s = self.zones[z], self.state[z]
+        limit = max(MAX_QUEUE_ROWS, min(FLUSH_MAX_BATCH, max(store.queue_depth, int(s.rate * FLUSH_INTERVAL))))
+        started = time.perf_counter()
+        try:
+            rows = await store.flush(limit)
+        except Exception as e:
+            s.errors += 1
+            s.failing += 1
+            delay = min(FLUSH_BACKOFF_MAX, FLUSH_BACKOFF * 2 ** (s.failing - 1))
+            s.retry_at = time.monotonic() + delay
+            # Log an error once, not on every retry
+            if str(e) != s.last_error:
+                logger.error(f"Scheduled flush of {store.name} failed: {e} (retrying with backoff)")
+            s.last_error = str(e)
+            return
+        finally:
+            del self._flushing[z]
+            self._wake.set()  # a slot is free; more may be pending
+        if s.failing:
+            logger.info(f"Flush of {store.name} recovered after {s.failing} failed attempts")
+            s.failing, s.retry_at, s.last_error = 0, 0.0, None
+        ms = (time.perf_counter() - started) * 1000
+        s.flushes += 1
+        s.rows += rows
+        s.latency_ms = ms if s.flushes == 1 else s.latency_ms + RATE_SMOOTHING * (ms - s.latency_ms)
+        s.latency_ms_max = max(s.latency_ms_max, ms)
+        s.lag_ms = age * 1000
+        s.lag_ms_max = max(s.lag_ms_max, s.lag_ms)
+
+    async def _checkpoint(self, z: int):
+        store, s = self.zones[z], self.state[z]
+        started = time.perf_counter()
+        try:
+            await store.checkpoint()
+            s.checkpoints += 1
+            s.checkpoint_ms = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            s.errors += 1
+            logger.error(f"Checkpoint of {store.name} failed: {e}")
+        finally:
+            self._checkpointing = None
+
+    # Metrics ───────────────────────────
+
+    @property
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        zones = {}
+        for z, s in self.state.items():
+            store = self.zones[z]
+            zones[z] = {
+                'queue_depth': store.queue_depth,
+                'lag_ms_now': round((now - store.pending_since) * 1000, 1) if store.pending_since is not None else 0.0,
+                'lag_ms_last': round(s.lag_ms, 1),
+                'lag_ms_max': round(s.lag_ms_max, 1),
+                'latency_ms_avg': round(s.latency_ms, 3),
+                'latency_ms_max': round(s.latency_ms_max, 3),
+                'write_rate': round(s.rate, 1),
+                'flushes': s.flushes,
+                'rows': s.rows,
+                'checkpoints': s.checkpoints,
+                'checkpoint_ms_last': round(s.checkpoint_ms, 3),
+                'rows_since_checkpoint': store.rows_since_checkpoint,
+                'errors': s.errors,
+                'failing': s.failing,
+                'retry_in': round(max(0.0, s.retry_at - now), 3),
+                'last_error': s.last_error,
+            }
+        return {
+            'interval': FLUSH_INTERVAL,
+            'concurrency': FLUSH_CONCURRENCY,
+            'flushing': sorted(self._flushing),
+            'zones': zones,
+        }
@@ -1,3 +1,7 @@
 def expand_sequence(n: int, length: int = 8):
     start = n * length + 1
-    return list(range(start, start + length))
\ No newline at end of file
+    return list(range(start, start + length))
+
+def tile_of(v: int, length: int = 8) -> int:
+    '''Inverse of `expand_sequence`: the tile number containing coordinate `v`.'''
+    return (v - 1) // length
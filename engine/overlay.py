@@ -0,0 +1,177 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger("db")
+
+# Rows are kept in the `entities` column order:
+# index(0), iter(1), uuid(2), state(3), name(4), description(5),
+# positionX(6), positionY(7), aesthetics(8), ownership(9), minted(10), timestamp(11)
+Row = tuple
+
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "0") == "1"
+
+def _dumps(row: Row) -> str:
+    # BLOB columns (packed aesthetics) are written as {"hex": ...}
+    return json.dumps([{"hex": v.hex()} if isinstance(v, bytes) else v for v in row], separators=(",", ":"))
+
+def _loads(line: str) -> Row:
+    return tuple(bytes.fromhex(v["hex"]) if isinstance(v, dict) else v for v in json.loads(line))
+
+class PendingOverlay:
+    '''
+    In-process view of writes that have not been flushed to ``entities`` yet.
+
+    Keyed by ``(index, iter)`` with secondary lookups by index and by
+    ``(positionX, positionY)``. Re-setting the same version replaces the
+    pending row, so repeated upserts are coalesced before flush.
+    '''
+    def __init__(self):
+        self._rows: dict[tuple[int, int], Row] = {}
+        self._by_index: dict[int, set[int]] = {}
+        self._by_pos: dict[tuple[int, int], set[tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def put(self, row: Row):
+        key = (row[0], row[1])
+        self._rows[key] = row
+        self._by_index.setdefault(row[0], set()).add(row[1])
+        self._by_pos.setdefault((row[6], row[7]), set()).add(key)
+
+    def get(self, index: int, iteration: int) -> Optional[Row]:
+        return self._rows.get((index, iteration))
+
+    def latest(self, index: int) -> Optional[Row]:
+        iters = self._by_index.get(index)
+        return self._rows[(index, max(iters))] if iters else None
+
+    def at(self, x: int, y: int) -> list[Row]:
+        return [self._rows[k] for k in self._by_pos.get((x, y), ())]
+
+    def rows(self, limit: Optional[int] = None) -> list[Row]:
+        '''Pending rows, oldest first.'''
+        rows = list(self._rows.values())
+        return rows if limit is None else rows[:limit]
+
+    def discard(self, rows: Iterable[Row]):
+        '''Drop flushed rows, keeping any version that was re-set since the snapshot.'''
+        for row in rows:
+            key = (row[0], row[1])
+            if self._rows.get(key) is not row:
+                continue
+            del self._rows[key]
+
+            iters = self._by_index[row[0]]
+            iters.discard(row[1])
+            if not iters:
+                del self._by_index[row[0]]
+
+            keys = self._by_pos[(row[6], row[7])]
+            keys.discard(key)
+            if not keys:
+                del self._by_pos[(row[6], row[7])]
+
+class WriteJournal:
+    '''
+    Append-only NDJSON journal backing a ``PendingOverlay``.
+
+    Every ``set`` appends one line to ``zone{i}.journal`` before it is
+    acknowledged. After a flush commits, ``seal`` renames that file to a
+    numbered segment (``zone{i}.journal.{n}``, constant time, on the event
+    loop) and appends continue in a new file. ``compact`` then writes the
+    rows still pending to ``zone{i}.journal.base`` and deletes the sealed
+    segments; it runs on the zone's writer thread. Replaying the base, the
+    segments and the live file, in that order, restores every unflushed
+    row (after a crash mid-compaction, also some flushed ones, which
+    re-commit unchanged). Set ``JOURNAL_FSYNC=1`` to fsync each append
+    (power-loss durability).
+    '''
+    def __init__(self, path: Path):
+        self.path = path
+        self.base = path.with_name(path.name + ".base")
+        self._fh = None
+        self._seq = max((n for n, _ in self._segments()), default=0)
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = self.path.open("a", encoding="utf-8")
+        return self._fh
+
+    def _segments(self) -> list[tuple[int, Path]]:
+        found = []
+        for p in self.path.parent.glob(self.path.name + ".*"):
+            n = p.name[len(self.path.name) + 1:]
+            if n.isdigit():
+                found.append((int(n), p))
+        return sorted(found)
+
+    def files(self) -> list[Path]:
+        '''Journal files on disk, oldest first.'''
+        files = [p for _, p in self._segments()]
+        return [p for p in (self.base, *files, self.path) if p.exists()]
+
+    def has_pending(self) -> bool:
+        return any(p.stat().st_size > 0 for p in self.files())
+
+    def replay(self) -> list[Row]:
+        rows = []
+        for path in self.files():
+            with path.open("r", encoding="utf-8") as f:
+                for n, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rows.append(_loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line is expected after a crash mid-append
+                        logger.warning(f"{path.name}: skipping unreadable journal line {n}")
+        return rows
+
+    def append(self, row: Row, fsync: bool = JOURNAL_FSYNC):
+        fh = self._open()
+        fh.write(_dumps(row) + "\n")
+        fh.flush()
+        if fsync:
+            os.fsync(fh.fileno())
+
+    def seal(self) -> list[Path]:
+        '''Move the live file aside as the next segment; returns every sealed segment, for ``compact``.'''
+        self.close()
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._seq += 1
+            self.path.replace(self.path.with_name(f"{self.path.name}.{self._seq}"))
+        return [p for _, p in self._segments()]
+
+    def compact(self, rows: list[Row], sealed: list[Path], fsync: bool = JOURNAL_FSYNC):
+        '''
+        Replace the base with ``rows`` (removing it when empty) and delete
+        ``sealed``. Never touches the live file, so it is safe to run in a
+        thread while ``append`` continues.
+        '''
+        if rows:
+            tmp = self.base.with_name(self.base.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(_dumps(row) + "\n")
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+            tmp.replace(self.base)
+        else:
+            self.base.unlink(missing_ok=True)
+        for path in sealed:
+            path.unlink(missing_ok=True)
+
+    def rewrite(self, rows: list[Row], fsync: bool = JOURNAL_FSYNC):
+        '''Replace the whole journal with ``rows`` (blocking; startup only).'''
+        self.compact(rows, self.seal(), fsync)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
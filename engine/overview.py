@@ -0,0 +1,216 @@
+import os
+import sqlite3
+from typing import Any, Iterable
+
+from .mapmath import tile_of
+
+# Level L summarizes square blocks of 8**L cells per side (8, 64, 512, ...)
+OVERVIEW_LEVELS = int(os.getenv("OVERVIEW_LEVELS", 6))
+OVERVIEW_GRID   = 64 # default blocks per viewport side
+
+# A cell's state is its top of stack: (ownership, minted, timestamp), or None when empty
+CellState = tuple[str | None, bool, float] | None
+
+def block_of(v: int, level: int) -> int:
+    '''Block number containing coordinate ``v`` at ``level`` (level 1 blocks are map tiles).'''
+    return tile_of(v, 8 ** level)
+
+def setup(conn: sqlite3.Connection) -> bool:
+    '''Create the pyramid tables; returns True when they are new and need ``backfill``.'''
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='overview'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS overview (
+            level       INTEGER NOT NULL,
+            bx          INTEGER NOT NULL,
+            by          INTEGER NOT NULL,
+            cells       INTEGER NOT NULL DEFAULT 0,
+            claimed     INTEGER NOT NULL DEFAULT 0,
+            minted      INTEGER NOT NULL DEFAULT 0,
+            owner       TEXT,
+            owner_cells INTEGER NOT NULL DEFAULT 0,
+            latest      REAL,
+            PRIMARY KEY (level, bx, by)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS overview_owners (
+            level     INTEGER NOT NULL,
+            bx        INTEGER NOT NULL,
+            by        INTEGER NOT NULL,
+            ownership TEXT NOT NULL,
+            cells     INTEGER NOT NULL,
+            PRIMARY KEY (level, bx, by, ownership)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ovo_rank ON overview_owners(level, bx, by, cells)")
+    return not exists
+
+def cell_states(conn: sqlite3.Connection, cells: Iterable[tuple[int, int]]) -> dict[tuple[int, int], CellState]:
+    '''Top of stack (highest latest iter) at each cell, read through ``idx_el_pos``.'''
+    states = {}
+    for x, y in cells:
+        row = conn.execute("""
+            SELECT l.ownership, e.minted, e.timestamp
+            FROM entities_latest l
+            CROSS JOIN entities e
+            ON e."index" = l."index"
+            AND e.iter = l.iter
+            WHERE l.positionX = ? AND l.positionY = ?
+            ORDER BY l.iter DESC
+            LIMIT 1
+        """, (x, y)).fetchone()
+        states[(x, y)] = None if row is None else (row[0], bool(row[1]), row[2] or 0.0)
+    return states
+
+def apply(
+        conn: sqlite3.Connection,
+        before: dict[tuple[int, int], CellState],
+        after: dict[tuple[int, int], CellState],
+        levels: int = OVERVIEW_LEVELS
+    ):
+    '''
+    Fold cell state changes into every level: counters move by the
+    difference between ``before`` and ``after``, ``latest`` only grows, and
+    the dominant owner of each touched block is re-read from
+    ``overview_owners`` through ``idx_ovo_rank`` (one seek per block).
+    '''
+    counts: dict[tuple[int, int, int], list] = {}  # block -> [cells, claimed, minted, latest]
+    owners: dict[tuple[int, int, int, str], int] = {}
+
+    for (x, y), new in after.items():
+        old = before.get((x, y))
+        if old == new:
+            continue
+        d_cells   = (new is not None) - (old is not None)
+        d_claimed = (new is not None and new[0] is not None) - (old is not None and old[0] is not None)
+        d_minted  = (new is not None and new[1]) - (old is not None and old[1])
+        latest = new[2] if new is not None else None
+
+        for level in range(1, levels + 1):
+            size = 8 ** level
+            block = (level, (x - 1) // size, (y - 1) // size)  # block_of, inlined
+            c = counts.setdefault(block, [0, 0, 0, None])
+            c[0] += d_cells
+            c[1] += d_claimed
+            c[2] += d_minted
+            if latest is not None and (c[3] is None or latest > c[3]):
+                c[3] = latest
+            if old is not None and old[0] is not None:
+                owners[(*block, old[0])] = owners.get((*block, old[0]), 0) - 1
+            if new is not None and new[0] is not None:
+                owners[(*block, new[0])] = owners.get((*block, new[0]), 0) + 1
+
+    conn.executemany("""
+        INSERT INTO overview (level, bx, by, cells, claimed, minted, latest)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(level, bx, by) DO UPDATE SET
+            cells   = cells + excluded.cells,
+            claimed = claimed + excluded.claimed,
+            minted  = minted + excluded.minted,
+            latest  = MAX(COALESCE(latest, excluded.latest), COALESCE(excluded.latest, latest))
+    """, [(*block, *c) for block, c in counts.items()])
+
+    changed = [(*key, d) for key, d in owners.items() if d]
+    conn.executemany("""
+        INSERT INTO overview_owners (level, bx, by, ownership, cells) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(level, bx, by, ownership) DO UPDATE SET cells = cells + excluded.cells
+    """, changed)
+    conn.executemany(
+        "DELETE FROM overview_owners WHERE level = ? AND bx = ? AND by = ? AND ownership = ? AND cells <= 0",
+        [key[:4] for key, d in owners.items() if d < 0]
+    )
+
+    for block in {key[:3] for key in changed}:
+        top = conn.execute("""
+            SELECT ownership, cells FROM overview_owners
+            WHERE level = ? AND bx = ? AND by = ?
+            ORDER BY cells DESC, ownership
+            LIMIT 1
+        """, block).fetchone()
+        conn.execute(
+            "UPDATE overview SET owner = ?, owner_cells = ? WHERE level = ? AND bx = ? AND by = ?",
+            (top[0] if top else None, top[1] if top else 0, *block)
+        )
+
+def backfill(conn: sqlite3.Connection, levels: int = OVERVIEW_LEVELS, batch: int = 10_000):
+    '''Build the pyramid of an existing zone file from ``entities_latest`` (inside the caller's transaction).'''
+    cursor = conn.execute("""
+        SELECT l.positionX, l.positionY, l.ownership, e.minted, e.timestamp
+        FROM entities_latest l
+        CROSS JOIN entities e
+        ON e."index" = l."index"
+        AND e.iter = l.iter
+        ORDER BY l.positionX, l.positionY, l.iter DESC
+    """)
+    seen = None
+    while rows := cursor.fetchmany(batch):
+        after = {}
+        for x, y, owner, minted, ts in rows:
+            if (x, y) != seen:  # first row per cell is the top of stack
+                after[(x, y)] = (owner, bool(minted), ts or 0.0)
+                seen = (x, y)
+        apply(conn, {}, after, levels)
+
+def pick_level(span: int, grid: int, levels: int = OVERVIEW_LEVELS) -> int:
+    '''Finest level at which ``span`` cells fit in ``grid`` blocks (capped at the top level).'''
+    level = 1
+    while level < levels and span > grid * 8 ** level:
+        level += 1
+    return level
+
+def clamp_bounds(bounds: dict[str, int], grid: int, levels: int = OVERVIEW_LEVELS) -> dict[str, int]:
+    '''``bounds`` shrunk around its centre to at most ``grid`` top-level blocks per side.'''
+    limit = grid * 8 ** levels
+    clamped = dict(bounds)
+    for lo, hi in (('min_x', 'max_x'), ('min_y', 'max_y')):
+        span = bounds[hi] - bounds[lo] + 1
+        if span > limit:
+            clamped[lo] = bounds[lo] + (span - limit) // 2
+            clamped[hi] = clamped[lo] + limit - 1
+    return clamped
+
+def query(
+        conn: sqlite3.Connection,
+        bounds: dict[str, int],
+        grid: int = OVERVIEW_GRID,
+        levels: int = OVERVIEW_LEVELS
+    ) -> dict[str, Any]:
+    '''
+    Summaries of the blocks covering ``bounds`` at the finest level that
+    needs at most ``grid`` blocks per side, so the answer has a bounded size
+    at any zoom. A viewport wider than ``grid`` top-level blocks is clamped
+    around its centre (``clamped``, with the ``bounds`` served). Blocks with
+    no entities are omitted.
+    '''
+    requested = {k: bounds[k] for k in ('min_x', 'max_x', 'min_y', 'max_y')}
+    bounds = clamp_bounds(requested, grid, levels)
+    span = max(bounds['max_x'] - bounds['min_x'], bounds['max_y'] - bounds['min_y']) + 1
+    level = pick_level(span, grid, levels)
+    size = 8 ** level
+    rows = conn.execute("""
+        SELECT bx, by, cells, claimed, minted, owner, owner_cells, latest
+        FROM overview
+        WHERE level = ?
+        AND bx BETWEEN ? AND ?
+        AND by BETWEEN ? AND ?
+        AND cells > 0
+    """, (
+        level,
+        block_of(bounds['min_x'], level), block_of(bounds['max_x'], level),
+        block_of(bounds['min_y'], level), block_of(bounds['max_y'], level)
+    )).fetchall()
+    return {
+        'level': level,
+        'block_size': size,
+        'bounds': bounds,
+        'clamped': bounds != requested,
+        'blocks': [
+            {
+                'bx': bx, 'by': by,
+                'min_x': bx * size + 1, 'min_y': by * size + 1,
+                'cells': cells, 'claimed': claimed, 'minted': minted,
+                'owner': owner, 'owner_cells': owner_cells, 'latest': latest
+            }
+            for bx, by, cells, claimed, minted, owner, owner_cells, latest in rows
+        ]
+    }
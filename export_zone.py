@@ -0,0 +1,109 @@
+'''
+Mirror a zone (or one owner's entities) to an NDJSON file through db_server's
+streaming `/export/{zone}` endpoint.
+
+    python3 export_zone.py 3 zone3.ndjson
+    python3 export_zone.py 3 zone3.ndjson --resume      # continue an interrupted run
+    python3 export_zone.py 3 - --ownership user:123     # to stdout
+
+Uses DB_SERVER and DB_X_API_KEY like fe_server.py.
+'''
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import httpx
+
+DB_KEY = str(os.getenv('DB_X_API_KEY', ''))
+DB_SERVER = str(os.getenv('DB_SERVER', 'http://localhost:9401'))
+
+def _lines_backwards(f, end: int):
+    '''``(offset, line)`` for every line of ``f`` before ``end``, last line first.'''
+    pos, head = end, b''
+    while pos > 0:
+        step = min(1 << 16, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + head).split(b'\n')
+        head = lines.pop(0)  # may continue in the previous block
+        offset = pos + len(head) + 1
+        found = []
+        for line in lines:
+            found.append((offset, line))
+            offset += len(line) + 1
+        yield from reversed(found)
+    yield 0, head
+
+def resume_point(path: Path) -> int | None:
+    '''
+    Trim an interrupted export so it can be continued: drop a torn final line
+    and every line of the last index (its versions may be incomplete), and
+    return the ``after_index`` to continue from.
+    '''
+    if not path.exists():
+        return None
+
+    with path.open('rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        last, cut = None, end
+        for offset, line in _lines_backwards(f, end):
+            try:
+                index = json.loads(line)['index']
+            except (ValueError, KeyError, TypeError):
+                if last is not None:
+                    break
+                cut = offset  # empty or torn tail
+                continue
+            if last is None:
+                last = index
+            if index != last:
+                break
+            cut = offset
+        f.truncate(cut)
+    return None if last is None else last - 1
+
+def export(zone: int, out, after_index: int | None, ownership: str | None, include_pending: bool) -> int:
+    params = {'include_pending': include_pending}
+    if after_index is not None:
+        params['after_index'] = after_index
+    if ownership:
+        params['ownership'] = ownership
+
+    written = 0
+    with httpx.stream(
+            'GET',
+            f'{DB_SERVER}/export/{zone}',
+            params=params,
+            headers={'X-API-Key': DB_KEY},
+            timeout=httpx.Timeout(30.0, read=None)
+        ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                out.write(line + '\n')
+                written += 1
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zone', type=int)
+    parser.add_argument('output', help="NDJSON file, or - for stdout")
+    parser.add_argument('--after-index', type=int, default=None)
+    parser.add_argument('--resume', action='store_true', help="continue after the last complete index in OUTPUT")
+    parser.add_argument('--ownership', default=None, help="only the latest entities owned by this id")
+    parser.add_argument('--include-pending', action='store_true', help="include writes not flushed to disk yet")
+    args = parser.parse_args()
+
+    after = args.after_index
+    if args.output == '-':
+        written = export(args.zone, sys.stdout, after, args.ownership, args.include_pending)
+    else:
+        path = Path(args.output)
+        if args.resume:
+            after = resume_point(path)
+        with path.open('a' if args.resume else 'w', encoding='utf-8') as f:
+            written = export(args.zone, f, after, args.ownership, args.include_pending)
+
+    print(f"zone {args.zone}: {written} rows (after_index={after})", file=sys.stderr)
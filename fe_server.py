@@ -7,16 +7,18 @@ from __future__ import annotations
 from engine import (
     verbose, versioning, mapmath,
     jsonsafe, security, validation, 
-    ratelimits, databases, tarot
+    ratelimits, databases, tarot,
+    dbclient, caching
 )
 
 import sqlite3
 import httpx
 import asyncio
-import os, json, enum, inspect, subprocess, uuid, threading, time, base64
+import os, json, enum, inspect, subprocess, uuid, threading, time, base64, hashlib
 
 DB_KEY = str(os.getenv('DB_X_API_KEY', ''))
 DB_SERVER = str(os.getenv('DB_SERVER', 'http://localhost:9401'))
+DB = dbclient.DBClient()  # shared, pooled connections to db_server; opened in lifespan
 
 from dataclasses import is_dataclass, asdict
 from decimal     import Decimal
@@ -33,9 +35,9 @@ import pandas as pd
 
 # FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi                 import FastAPI, Header, HTTPException, status, BackgroundTasks, Depends, Request, Cookie
+from fastapi                 import FastAPI, Header, HTTPException, status, BackgroundTasks, Depends, Request, Response, Cookie
 from fastapi.security        import APIKeyHeader
-from fastapi.responses       import PlainTextResponse # might be removed later
+from fastapi.responses       import PlainTextResponse, StreamingResponse, JSONResponse # PlainText might be removed later
 from uvicorn                 import run as uvicorn_run
 from pydantic                import BaseModel, Field, field_validator
 
@@ -89,7 +91,18 @@ class EntititesRequest(BaseModel):
     z_axis: int
     _validate_z_axis = field_validator("z_axis")(validate_zone_int)
     
-    time_axis: float | None
+    time_axis: float | None  # timestamp; render the map as it was at that time
+    since: str | None = Field(None, max_length=64)  # tile `version` the client holds; reply with changed cells only
+
+class TimelineRequest(BaseModel):
+    x_axis: int  # map X
+    y_axis: int  # map Y
+
+    z_axis: int
+    _validate_z_axis = field_validator("z_axis")(validate_zone_int)
+
+    since: float | None = None
+    until: float | None = None
 
 class EntityRequest(BaseModel):
     x_pos: int  # absolute position
@@ -116,6 +129,31 @@ class ZoneOwnershipQuery(BaseModel):
     _validate_zone = field_validator("zone")(validate_zone_int)
     after_index: int | None = None  # (is cursor integer)
 
+class OverviewRequest(BaseModel):
+    min_x: int
+    max_x: int
+    min_y: int
+    max_y: int
+
+    z_axis: int
+    _validate_z_axis = field_validator("z_axis")(validate_zone_int)
+
+    grid: int = Field(64, ge=1, le=128)
+
+class OwnershipTotalsQuery(BaseModel):
+    ownership: str
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=databases.SEARCH_MIN_CHARS, max_length=256)
+    zones: list[int] | None = None  # None = every zone
+    limit: int = Field(20, ge=1, le=50)
+    offset: int = Field(0, ge=0)
+
+    @field_validator("zones")
+    @classmethod
+    def _validate_zones(cls, v):
+        return v if v is None else [validate_zone_int(z) for z in v]
+
 class AreaRequest(BaseModel):
     xyzs: list  # [(x,y,z,string),(...)]
 
@@ -129,7 +167,9 @@ async def lifespan(server: FastAPI):
     #global ZONES
     #for store in ZONES.values():
     #    await store.init()
+    await DB.start()
     yield
+    await DB.stop()
     #for store in ZONES.values():
     #    await store.close()
 
@@ -141,7 +181,8 @@ server.add_middleware(
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["ETag"]
 )
 
 def ThrowHTTPError(message, status_code=status.HTTP_401_UNAUTHORIZED):
@@ -158,6 +199,27 @@ ThrowIf = lambda statement, error_message='', status_code=status.HTTP_401_UNAUTH
 :type status_code: int
 '''
 
+def WriteRejectedResponse(db_response: httpx.Response) -> JSONResponse | None:
+    '''
+    Relay db_server's write admission refusal (429 queue full, 503 zone
+    unavailable) with its status and ``Retry-After``, so clients back off
+    instead of retrying at once. ``None`` for any other response.
+    '''
+    if db_response.status_code not in (status.HTTP_429_TOO_MANY_REQUESTS, status.HTTP_503_SERVICE_UNAVAILABLE):
+        return None
+    try:
+        detail = db_response.json().get('detail')
+    except ValueError:
+        detail = None
+    if not isinstance(detail, dict):
+        detail = {"message": f"Database Error: {db_response.status_code}"}
+    headers = {"Retry-After": db_response.headers["Retry-After"]} if "Retry-After" in db_response.headers else None
+    return JSONResponse(
+        status_code=db_response.status_code,
+        content=ServerOkayResponse(message="ERROR", db_health=detail).model_dump(),
+        headers=headers
+    )
+
 # NOTE : For actions that require an API Key!
 # NOTE : But this doesn't work right from Github Pages through Caddy anyway!!
 def Authorization(api_key = Depends(strict_api_key_header)) -> security.DecryptedToken:
@@ -310,14 +372,58 @@ async def give_decrypted_key(
 
     return decrypted
 
+FE_TILE_CACHE_ENTRIES = int(os.getenv("FE_TILE_CACHE_ENTRIES", 4096))
+FE_TILE_CACHE_BYTES   = int(os.getenv("FE_TILE_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Rendered live tiles (x, y, entities, banner). Key: (zone, tile_x, tile_y, db tile version)
+TILE_RENDERS = caching.SegmentedLRU("fe:tiles", FE_TILE_CACHE_ENTRIES, FE_TILE_CACHE_BYTES)
+tiles_not_modified = 0
+
+async def tile_version(z: int, tile_x: int, tile_y: int) -> str | None:
+    '''db_server's render version of a tile; None if it cannot tell (render without caching).'''
+    response = await DB.shared_post(
+        DB_SERVER + f"/tile_version/{z}",
+        headers={"X-API-Key": DB_KEY},
+        json={'tiles': [[tile_x, tile_y]]}
+    )
+    if response.status_code != status.HTTP_200_OK:
+        return None
+    return response.json()['versions'][0]
+
+async def tile_changes(z: int, tile_x: int, tile_y: int, since: str) -> tuple[str | None, list | None]:
+    '''``(version, cells changed after since)``; cells are None when the whole tile must be sent.'''
+    response = await DB.shared_post(
+        DB_SERVER + f"/tile_changes/{z}",
+        headers={"X-API-Key": DB_KEY},
+        json={'tile_x': tile_x, 'tile_y': tile_y, 'since': since}
+    )
+    if response.status_code != status.HTTP_200_OK:
+        return None, None
+    data = response.json()
+    return data['version'], data['cells']
+
+def render_etag(z: int, tile_x: int, tile_y: int, version: str, user_context: security.DecryptedToken) -> str:
+    # The body carries user_context, so the tag changes with it too
+    user = hashlib.sha256(user_context.model_dump_json().encode()).hexdigest()[:12]
+    return f'W/"{z}.{tile_x}.{tile_y}.{version}.{user}"'
+
 @server.post('/api/render')
 async def render_provider(
         request: Request, 
+        reply: Response,
         payload: EntititesRequest, 
         user_context:security.DecryptedToken = Depends(APIKeyPresence)
     ):
+    '''
+    One 8x8 tile. Live views (no ``time_axis``) are cached under the tile's
+    db version and tagged with an ETag; a request whose ``If-None-Match``
+    still matches gets an empty ``304``.
 
-    # TODO : time axis not yet implemented
+    Delta mode: with ``since`` (the ``version`` of a tile the client holds)
+    the reply has ``delta: true`` and only the ``cells`` changed after it,
+    unless that version is from before a db restart (full tile).
+    '''
+    global tiles_not_modified
 
     client_host = request.client.host
     if not ratelimits.within_ip_rate_limit(client_ip=client_host):
@@ -333,58 +439,92 @@ async def render_provider(
     min_y = y[0]
     max_y = y[-1]
     z = payload.z_axis  # ZONE
+    tile = (z, payload.x_axis, payload.y_axis)
+
+    def delta(cells: list) -> dict:
+        return {
+            'message': 'OK', 'delta': True, 'version': version, 'x': x, 'y': y,
+            'cells': cells, 'user_context': user_context, 'banner': databases.ZONE_COLORS[z]
+        }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                DB_SERVER + f"/range/{z}",
-                headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
-                json={
-                    'min_x': min_x,
-                    'max_x': max_x,
-                    'min_y': min_y,
-                    'max_y': max_y,
-                    'limit': 64
-                }
-            )
+        version, changed = None, None
+        if payload.time_axis is None:
+            if payload.since is not None:
+                version, changed = await tile_changes(*tile, payload.since)
+            else:
+                version = await tile_version(*tile)
+
+        if version is not None:
+            etag = render_etag(*tile, version, user_context)
+            if request.headers.get("if-none-match") == etag:
+                tiles_not_modified += 1
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            rendered = TILE_RENDERS.get((*tile, version))
+            if rendered is not None:
+                reply.headers["ETag"] = etag
+                if changed is not None:
+                    return delta([rendered['entities'][cy - y[0]][cx - x[0]] for cx, cy in changed])
+                return {'message': 'OK', **rendered, 'version': version, 'user_context': user_context}
+
+        response = await DB.shared_post(
+            DB_SERVER + f"/range/{z}",
+            headers={"X-API-Key": DB_KEY},
+            json={
+                'min_x': min_x,
+                'max_x': max_x,
+                'min_y': min_y,
+                'max_y': max_y,
+                'limit': 64,
+                'as_of': payload.time_axis
+            }
+        )
 
-            if response.status_code == status.HTTP_200_OK:
-                
-                data = response.json()
+        if response.status_code == status.HTTP_200_OK:
+            
+            data = response.json()
 
-                # Index DB results by (x, y)
+            if changed is not None:
+                # Only the changed cells are normalized (or generated)
+                wanted = {tuple(cell) for cell in changed}
                 entity_map = {
                     (ent["positionX"], ent["positionY"]): databases.normalize_entity(ent, z)
-                    for ent in data
+                    for ent in data if (ent["positionX"], ent["positionY"]) in wanted
                 }
+                empty = [(cx, cy, z) for cx, cy in changed if (cx, cy) not in entity_map]
+                entity_map.update(((cx, cy), ent) for (cx, cy, _), ent in zip(empty, databases.genesis_many(empty)))
+                reply.headers["ETag"] = etag
+                return delta([entity_map[(cx, cy)] for cx, cy in changed])
+
+            # Index DB results by (x, y)
+            entity_map = {
+                (ent["positionX"], ent["positionY"]): databases.normalize_entity(ent, z)
+                for ent in data
+            }
 
-                result_grid = []
-
-                for _y in y:
-                    row = []
-                    for _x in x:
-                        ent = entity_map.get((_x, _y))
-                        if ent is None:
-                            ent = databases.entity_genesis(_x, _y, z)
-                        row.append(ent)
-                    result_grid.append(row)
-
-                # TODO : Commit genesis entities. (Not on seen.)
-                return {
-                    'message': 'OK',
-                    'x': x,
-                    'y': y,
-                    'entities': result_grid,
-                    'user_context': user_context,
-                    'banner': databases.ZONE_COLORS[z]
-                }
-            
-            else:
-                return ServerOkayResponse(
-                    message="ERROR",
-                    db_health={"message": f"DB returned {response.status_code}"}
-                )
+            # Empty cells are generated in one batch
+            empty = [(_x, _y, z) for _y in y for _x in x if (_x, _y) not in entity_map]
+            entity_map.update(((_x, _y), ent) for (_x, _y, _), ent in zip(empty, databases.genesis_many(empty)))
+
+            result_grid = [[entity_map[(_x, _y)] for _x in x] for _y in y]
+
+            # TODO : Commit genesis entities. (Not on seen.)
+            rendered = {
+                'x': x,
+                'y': y,
+                'entities': result_grid,
+                'banner': databases.ZONE_COLORS[z]
+            }
+            if version is not None:
+                TILE_RENDERS.put((*tile, version), rendered, caching.estimate_rows_bytes(e for row in result_grid for e in row))
+                reply.headers["ETag"] = etag
+            return {'message': 'OK', **rendered, 'version': version, 'user_context': user_context}
+        
+        else:
+            return ServerOkayResponse(
+                message="ERROR",
+                db_health={"message": f"DB returned {response.status_code}"}
+            )
     
     except httpx.ConnectError:
         return ServerOkayResponse(
@@ -440,13 +580,12 @@ async def entity_edit(
     }
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with DB.session() as client:
             response = await client.post(
                 DB_SERVER + "/expand",  # Only query for our intended target
                 headers={
                     "X-API-Key": DB_KEY,
                 },
-                timeout=5.0,
                 json={
                     'x': _xpos, 'y': _ypos, 'z': _zone, 'i': _iter
                 }
@@ -494,11 +633,12 @@ async def entity_edit(
             set_response = await client.post(
                 DB_SERVER + f"/set/{_zone}",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
                 json=target_iter_entity
             )
 
             Tee.log(f'[/api/edit] Response status: {set_response.status_code}')
+            if (rejected := WriteRejectedResponse(set_response)) is not None:
+                return rejected
             if set_response.status_code != status.HTTP_200_OK:
                 Tee.log('! Diagnostic: ' + set_response.text)
                 return ServerOkayResponse(
@@ -566,29 +706,214 @@ async def get_area_ownership_data(
         json_payload['after_index'] = payload.after_index
     
     try:
-        async with httpx.AsyncClient() as client:
+        response = await DB.shared_post(
+            DB_SERVER + f"/ownership/{payload.zone}",
+            headers={"X-API-Key": DB_KEY},
+            json=json_payload
+        )
+
+        if response.status_code != status.HTTP_200_OK:
+            return ServerOkayResponse(
+                message="ERROR",
+                db_health={"message": f"Failed to fetch entity: {response.status_code}"}
+            )
+        
+        data = response.json()         
+        return data
+        
+    except httpx.ConnectError:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Database server unreachable"}
+        )
+
+@server.post('/api/ownership/totals') # stacks held per zone, for the user page
+async def get_ownership_totals(
+        request: Request,
+        payload: OwnershipTotalsQuery
+    ):
+
+    client_host = request.client.host
+    if not ratelimits.within_ip_rate_limit(client_ip=client_host, RATE=15):
+        return ServerOkayResponse(
+            message='ERROR',
+            db_health={"message": "Rate Limit Exceeded"}
+        )
+
+    if (not payload.ownership) or (payload.ownership == '00000000'):
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Ownership payload invalid."}
+        )
+
+    try:
+        async with DB.session() as client:
             response = await client.post(
-                DB_SERVER + f"/ownership/{payload.zone}",
+                DB_SERVER + "/owner_totals",
                 headers={"X-API-Key": DB_KEY},
-                timeout=10.0, # Might be heavy payload
-                json=json_payload
+                json={'ownership': payload.ownership}
             )
 
             if response.status_code != status.HTTP_200_OK:
                 return ServerOkayResponse(
                     message="ERROR",
-                    db_health={"message": f"Failed to fetch entity: {response.status_code}"}
+                    db_health={"message": f"Failed to fetch totals: {response.status_code}"}
                 )
-            
-            data = response.json()         
-            return data
-        
+
+            return response.json()
+
+    except httpx.ConnectError:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Database server unreachable"}
+        )
+
+@server.post('/api/search') # name / description search for the search page
+async def search_entities(
+        request: Request,
+        payload: SearchRequest
+    ):
+    '''Ranked substring search over the latest name and description of every entity.'''
+
+    client_host = request.client.host
+    if not ratelimits.within_ip_rate_limit(client_ip=client_host, RATE=15):
+        return ServerOkayResponse(
+            message='ERROR',
+            db_health={"message": "Rate Limit Exceeded"}
+        )
+
+    if payload.offset + payload.limit > databases.SEARCH_MAX_RESULTS:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": f"Only the first {databases.SEARCH_MAX_RESULTS} results can be paged."}
+        )
+
+    try:
+        async with DB.session() as client:
+            response = await client.post(
+                DB_SERVER + "/search",
+                headers={"X-API-Key": DB_KEY},
+                json=payload.model_dump()
+            )
+
+            if response.status_code != status.HTTP_200_OK:
+                return ServerOkayResponse(
+                    message="ERROR",
+                    db_health={"message": f"Search failed: {response.status_code}"}
+                )
+
+            results = response.json()["results"]
+            for hit in results:
+                hit["entity"] = databases.normalize_entity(hit["entity"], hit["zone"])
+            return {
+                "results": results,
+                "offset": payload.offset,
+                "next_offset": payload.offset + len(results) if len(results) == payload.limit else None
+            }
+
+    except httpx.ConnectError:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Database server unreachable"}
+        )
+
+@server.post('/api/overview') # zoomed-out map
+async def overview_provider(
+        request: Request,
+        payload: OverviewRequest
+    ):
+    '''Per-block summaries for a viewport of any size (at most `grid` blocks per side).'''
+
+    client_host = request.client.host
+    if not ratelimits.within_ip_rate_limit(client_ip=client_host):
+        return ServerOkayResponse(
+            message='ERROR',
+            db_health={"message": "Rate Limit Exceeded"}
+        )
+
+    try:
+        async with DB.session() as client:
+            response = await client.post(
+                DB_SERVER + f"/overview/{payload.z_axis}",
+                headers={"X-API-Key": DB_KEY},
+                json=payload.model_dump(exclude={"z_axis"})
+            )
+
+            if response.status_code != status.HTTP_200_OK:
+                return ServerOkayResponse(
+                    message="ERROR",
+                    db_health={"message": f"Failed to fetch overview: {response.status_code}"}
+                )
+
+            return {**response.json(), "positionZ": payload.z_axis}
+
     except httpx.ConnectError:
         return ServerOkayResponse(
             message="ERROR",
             db_health={"message": "Database server unreachable"}
         )
 
+@server.post('/api/timeline')
+async def timeline_provider(
+        request: Request, 
+        payload: TimelineRequest, 
+        user_context:security.DecryptedToken = Depends(APIKeyPresence)
+    ):
+    '''Stream every version in one map tile in timestamp order (NDJSON), for playback.'''
+
+    client_host = request.client.host
+    if not ratelimits.within_ip_rate_limit(client_ip=client_host):
+        return ServerOkayResponse(
+            message='ERROR',
+            db_health={"message": "Rate Limit Exceeded"}
+        )
+
+    x = mapmath.expand_sequence(payload.x_axis)
+    y = mapmath.expand_sequence(payload.y_axis)
+    z = payload.z_axis  # ZONE
+
+    await DB.start()  # no-op once the lifespan has opened it
+    client = DB.client
+    try:
+        response = await client.send(
+            client.build_request(
+                "POST",
+                DB_SERVER + f"/timeline/{z}",
+                headers={"X-API-Key": DB_KEY},
+                json={
+                    'min_x': x[0],
+                    'max_x': x[-1],
+                    'min_y': y[0],
+                    'max_y': y[-1],
+                    'since': payload.since,
+                    'until': payload.until
+                }
+            ),
+            stream=True
+        )
+    except httpx.ConnectError:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Database server unreachable"}
+        )
+
+    if response.status_code != status.HTTP_200_OK:
+        await response.aclose()
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": f"DB returned {response.status_code}"}
+        )
+
+    async def relay():
+        try:
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.dumps(databases.normalize_entity(json.loads(line), z)) + "\n"
+        finally:
+            await response.aclose()
+
+    return StreamingResponse(relay(), media_type="application/x-ndjson")
+
 @server.post('/api/render/areas') # for map
 async def provide_area_render(
         request: Request,
@@ -603,7 +928,7 @@ async def provide_area_render(
             db_health={"message": "Rate Limit Exceeded"}
         )
     
-    ents = []
+    points = []
     for req in payload.xyzs:
         if isinstance(req, str):
             req = str(req).split(',')
@@ -614,8 +939,43 @@ async def provide_area_render(
         s=str(req[3])
         if z not in databases.ZONE_INTEGERS:
             continue
-        ent = databases.normalize_entity(databases.entity_genesis(x, y, z), z)
-        ent['repr'] = {'x': int(req[0]), 'y': int(req[1]), 's': s}
+        points.append((x, y, z, {'x': int(req[0]), 'y': int(req[1]), 's': s}))
+
+    try:
+        # One round trip per EXPAND_MANY_MAX cells, sent together; db_server runs one query per zone
+        chunks = [points[i:i + databases.EXPAND_MANY_MAX] for i in range(0, len(points), databases.EXPAND_MANY_MAX)]
+        async with DB.session() as client:
+            responses = await asyncio.gather(*[
+                client.post(
+                    DB_SERVER + "/expandmany",
+                    headers={"X-API-Key": DB_KEY},
+                    json={'points': [{'x': x, 'y': y, 'z': z} for x, y, z, _ in chunk]}
+                )
+                for chunk in chunks
+            ])
+
+        found = []
+        for response in responses:
+            if response.status_code != status.HTTP_200_OK:
+                return ServerOkayResponse(
+                    message="ERROR",
+                    db_health={"message": f"DB returned {response.status_code}"}
+                )
+            found.extend(response.json()['entities'])
+
+    except httpx.ConnectError:
+        return ServerOkayResponse(
+            message="ERROR",
+            db_health={"message": "Database server unreachable"}
+        )
+
+    generated = iter(databases.genesis_many((x, y, z) for (x, y, z, _), ent in zip(points, found) if ent is None))
+    ents = []
+    for (x, y, z, r), ent in zip(points, found):
+        if ent is None:
+            ent = next(generated)
+        ent = databases.normalize_entity(ent, z)
+        ent['repr'] = r
         ents.append(ent)
     
     return { 'entities': ents, 'user_context': user_context }
@@ -637,11 +997,10 @@ async def iter_request(
     _xpos, _ypos, _zone, _iter = ([int(n) for n in [payload.x_pos, payload.y_pos, payload.zone, payload.iter]])
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with DB.session() as client:
             response = await client.post(
                 DB_SERVER + "/expandall",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
                 json={
                     'x': _xpos, 'y': _ypos, 'z': _zone, 'i': _iter
                 }
@@ -689,11 +1048,12 @@ async def iter_request(
             set_response = await client.post(
                 DB_SERVER + f"/set/{_zone}",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
                 json=new_entity
             )
 
             Tee.log(f"[/api/newiter] Response status: {set_response.status_code}")
+            if (rejected := WriteRejectedResponse(set_response)) is not None:
+                return rejected
             if set_response.status_code != status.HTTP_200_OK:
                 Tee.log(f"[/api/newiter] Error response: {set_response.text}")
                 return ServerOkayResponse(
@@ -756,12 +1116,11 @@ async def mint_entity(
     _xpos, _ypos, _zone, _iter = ([int(n) for n in [payload.x_pos, payload.y_pos, payload.zone, payload.iter]])
     
     try:
-        async with httpx.AsyncClient() as client:
+        async with DB.session() as client:
             # Fetch current entity state from database
             response = await client.post(
                 DB_SERVER + "/expandall",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
                 json={
                     'x': _xpos, 'y': _ypos, 'z': _zone, 'i': _iter
                 }
@@ -822,11 +1181,12 @@ async def mint_entity(
             set_response = await client.post(
                 DB_SERVER + f"/set/{_zone}",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
                 json=entity_to_mint
             )
             
             Tee.log(f"[/api/mint] Response status: {set_response.status_code}")
+            if (rejected := WriteRejectedResponse(set_response)) is not None:
+                return rejected
             if set_response.status_code != status.HTTP_200_OK:
                 Tee.log(f"[/api/mint] Error response: {set_response.text}")
                 return ServerOkayResponse(
@@ -902,61 +1262,59 @@ async def provide_single_render(
     _xpos, _ypos, _zone, _iter = ([int(n) for n in [payload.x_pos, payload.y_pos, payload.zone, payload.iter]])
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                DB_SERVER + f"/expandall",
-                headers={"X-API-Key": DB_KEY},
-                timeout=5.0,
-                json={
-                    'x': _xpos, 'y': _ypos, 'z': _zone, 'i': _iter  # intended_iter
-                }
-            )
+        response = await DB.shared_post(
+            DB_SERVER + f"/expandall",
+            headers={"X-API-Key": DB_KEY},
+            json={
+                'x': _xpos, 'y': _ypos, 'z': _zone, 'i': _iter  # intended_iter
+            }
+        )
+
+        if response.status_code == status.HTTP_200_OK:
 
-            if response.status_code == status.HTTP_200_OK:
+            data = response.json()
 
-                data = response.json()
+            entities = data["entities"]
+            
+            Tee.log(f"[/api/render/one] entities: {entities}")
+            Tee.log(f"[/api/render/one] entities type: {type(entities)}")
 
-                entities = data["entities"]
-                
-                Tee.log(f"[/api/render/one] entities: {entities}")
-                Tee.log(f"[/api/render/one] entities type: {type(entities)}")
+            entity_normals = {
+                int(ent["iter"]): databases.normalize_entity(ent, _zone)
+                for ent in entities
+            }
 
-                entity_normals = {
-                    int(ent["iter"]): databases.normalize_entity(ent, _zone)
-                    for ent in entities
-                }
+            sorted_normals = dict(sorted(entity_normals.items()))
+            #iter_is_latest = data["is_latest_on_file"]
 
-                sorted_normals = dict(sorted(entity_normals.items()))
-                #iter_is_latest = data["is_latest_on_file"]
-
-                # NOTE : Commit Entity not done here.
-                return {
-                    'message': 'OK',
-                    'x': _xpos,
-                    'y': _ypos,
-                    'z': _zone,
-                    'entity': (
-                        { 
-                            0 : databases.entity_genesis(_xpos, _ypos, _zone) 
-                        }
-                        if not entity_normals else
-                        sorted_normals
-                    ),
-                    'intended_iter': _iter,
-                    'iter_is_latest': data["is_latest_on_file"],
-                    'user_context': user_context,
-                    'banner': databases.ZONE_COLORS[_zone]
-                }
-            
-            else:
-                return ServerOkayResponse(
-                    message="ERROR",
-                    db_health={
-                        "message": "Unexpected error occurred.", 
-                        "status_code": response.status_code,
-                        "server_message": response.text
+            # NOTE : Commit Entity not done here.
+            return {
+                'message': 'OK',
+                'x': _xpos,
+                'y': _ypos,
+                'z': _zone,
+                'entity': (
+                    { 
+                        0 : databases.entity_genesis(_xpos, _ypos, _zone) 
                     }
-                )
+                    if not entity_normals else
+                    sorted_normals
+                ),
+                'intended_iter': _iter,
+                'iter_is_latest': data["is_latest_on_file"],
+                'user_context': user_context,
+                'banner': databases.ZONE_COLORS[_zone]
+            }
+        
+        else:
+            return ServerOkayResponse(
+                message="ERROR",
+                db_health={
+                    "message": "Unexpected error occurred.", 
+                    "status_code": response.status_code,
+                    "server_message": response.text
+                }
+            )
     
     except httpx.ConnectError:
         return ServerOkayResponse(
@@ -974,28 +1332,31 @@ async def provide_single_render(
 @server.get("/api/health", response_model=ServerOkayResponse)
 async def system_health_check():
     try:
-        async with httpx.AsyncClient() as client:
+        async with DB.session() as client:
             response = await client.get(
                 DB_SERVER + "/health",
                 headers={"X-API-Key": DB_KEY},
-                timeout=5.0
             )
 
         if response.status_code == status.HTTP_200_OK:
             return ServerOkayResponse(
                 message="OK",
-                db_health=response.json()
+                db_health={
+                    **response.json(),
+                    "fe_client": DB.metrics,
+                    "fe_tiles": {**TILE_RENDERS.metrics, 'not_modified': tiles_not_modified}
+                }
             )
 
         return ServerOkayResponse(
             message="ERROR",
-            db_health={"message": f"DB returned {response.status_code}"}
+            db_health={"message": f"DB returned {response.status_code}", "fe_client": DB.metrics}
         )
 
     except httpx.ConnectError:
         return ServerOkayResponse(
             message="ERROR",
-            db_health={"message": "Database server unreachable"}
+            db_health={"message": "Database server unreachable", "fe_client": DB.metrics}
         )
 
 if __name__ == "__main__":
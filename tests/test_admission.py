@@ -0,0 +1,41 @@
+import asyncio
+import sqlite3
+import types
+
+import pytest
+
+from engine import databases
+
+def entity(x: int, y: int) -> dict:
+    ent = databases.entity_genesis(x, y, 0)
+    ent.pop('exists')
+    ent.update(ownership='owner', minted=True, iter=0, index=x)
+    return ent
+
+def test_failing_zone_rejects_writes_below_high_water(tmp_path):
+    async def scenario():
+        store = databases.EntityStore(tmp_path / 'zone0.sqlite', zone=0)
+        await store.open()
+        store.scheduler = types.SimpleNamespace(wake=lambda: None)
+        await store.set(entity(1, 1))
+
+        commit_rows = store._commit_rows
+        def fail(conn, rows):
+            raise sqlite3.OperationalError('disk I/O error')
+        store._commit_rows = fail
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush(databases.MAX_QUEUE_ROWS)
+        assert store.flush_failing
+        assert store.queue_depth < databases.QUEUE_HIGH_WATER
+
+        with pytest.raises(databases.WriteRejected) as rejected:
+            store.admit()
+        assert rejected.value.status_code == 503
+        assert rejected.value.reason == 'flush_failing'
+
+        # A successful flush clears the flag and writes are admitted again
+        store._commit_rows = commit_rows
+        assert await store.flush(databases.MAX_QUEUE_ROWS) == 1
+        store.admit()
+        await store.close()
+    asyncio.run(scenario())
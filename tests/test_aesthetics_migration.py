@@ -0,0 +1,47 @@
+import asyncio
+import json
+import sqlite3
+
+from engine import databases
+
+# Zone file layout before the journal and packed aesthetics (JSON TEXT, pending rows in write_queue)
+COLUMNS = """
+    'index' INTEGER NOT NULL, 'iter' INTEGER NOT NULL, uuid TEXT, state INTEGER, name TEXT,
+    description TEXT, positionX INTEGER, positionY INTEGER, aesthetics TEXT, ownership TEXT,
+    minted INTEGER, timestamp INTEGER
+"""
+
+def baseline_row(index: int) -> tuple:
+    ent = databases.entity_genesis(index, 1, 0)
+    return (
+        index, 0, ent['uuid'], 0, 'Void', 'Genesis', index, 1,
+        json.dumps(ent['aesthetics']), 'owner', 1, int(ent['timestamp'])
+    )
+
+def test_baseline_zone_with_queued_rows_is_fully_packed(tmp_path):
+    path = tmp_path / 'zone0.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE entities ({COLUMNS}, PRIMARY KEY ('index', 'iter'))")
+    conn.execute(f"CREATE TABLE write_queue (queue_id INTEGER PRIMARY KEY AUTOINCREMENT, {COLUMNS})")
+    conn.executemany("INSERT INTO entities VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", [baseline_row(i) for i in range(1, 51)])
+    conn.executemany(
+        "INSERT INTO write_queue ('index', 'iter', uuid, state, name, description, positionX, positionY, aesthetics, ownership, minted, timestamp) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+        [baseline_row(i) for i in range(51, 56)]
+    )
+    conn.commit()
+    conn.close()
+
+    async def migrate_and_close():
+        store = databases.EntityStore(path, zone=0)
+        await store.open()
+        while not store._migrate_task.done():
+            await asyncio.sleep(0.01)
+        await store.close()  # flushes the recovered queue rows
+    asyncio.run(migrate_and_close())
+
+    conn = sqlite3.connect(path)
+    types = conn.execute("SELECT typeof(aesthetics), COUNT(*) FROM entities GROUP BY 1").fetchall()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    assert version == databases.AESTHETICS_MIGRATED
+    assert types == [('blob', 55)]
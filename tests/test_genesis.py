@@ -0,0 +1,44 @@
+import json
+import random
+
+from engine import databases
+
+def comparable(ent: dict) -> str:
+    # Everything but the timestamp, in key order, so the JSON is byte-identical
+    return json.dumps({**ent, 'timestamp': None}, ensure_ascii=False)
+
+def random_points(n: int, seed: int = 0) -> list[tuple[int, int, int]]:
+    rng = random.Random(seed)
+    return [
+        (rng.randint(-10**6, 10**12) if i % 10 == 0 else rng.randint(1, 4096),
+         rng.randint(-10**6, 4096) if i % 10 == 5 else rng.randint(1, 4096),
+         rng.choice(databases.ZONE_INTEGERS))
+        for i in range(n)
+    ]
+
+def test_genesis_many_matches_entity_genesis_cold_and_warm():
+    points = random_points(3000)
+    expected = [comparable(databases.entity_genesis(*point)) for point in points]
+    with databases._genesis_lock:
+        databases._genesis_memo.clear()
+    cold = [comparable(ent) for ent in databases.genesis_many(points)]
+    warm = [comparable(ent) for ent in databases.genesis_many(points)]
+    assert cold == expected
+    assert warm == expected
+
+def test_genesis_many_returns_fresh_dicts():
+    first, again = databases.genesis_many([(3, 4, 0)]), databases.genesis_many([(3, 4, 0)])
+    first[0]['aesthetics']['bar']['channel_0'] = 'changed'
+    assert comparable(again[0]) == comparable(databases.entity_genesis(3, 4, 0))
+
+def test_fast_parts_match_exact_parts():
+    rng = random.Random()
+    for point in random_points(5000, seed=1):
+        assert databases._genesis_parts_fast(rng, *point) == databases._genesis_parts_exact(rng, *point), point
+
+def test_fast_parts_fall_back_when_words_run_out(monkeypatch):
+    # Too few words for 16 choices: every cell takes the exact path mid-draw
+    monkeypatch.setattr(databases, '_GENESIS_WORDS', 8)
+    rng = random.Random()
+    for point in random_points(200, seed=2):
+        assert databases._genesis_parts_fast(rng, *point) == databases._genesis_parts_exact(rng, *point), point
@@ -0,0 +1,36 @@
+import sqlite3
+
+from engine import overview
+
+LEVELS = 2  # blocks of 8 and 64 cells per side
+GRID = 4    # blocks per viewport side; the top level covers 4 * 64 = 256 cells
+
+def pyramid(cells: list[tuple[int, int]]) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    overview.setup(conn)
+    overview.apply(conn, {}, {cell: ("owner", False, 1.0) for cell in cells}, LEVELS)
+    return conn
+
+def test_viewport_within_top_level_is_not_clamped():
+    conn = pyramid([(1, 1), (200, 200)])
+    bounds = {'min_x': 1, 'max_x': 256, 'min_y': 1, 'max_y': 256}
+    result = overview.query(conn, bounds, GRID, LEVELS)
+    assert result['level'] == LEVELS
+    assert result['clamped'] is False
+    assert result['bounds'] == bounds
+    assert len(result['blocks']) == 2
+
+def test_viewport_wider_than_top_level_is_clamped():
+    # One occupied cell in every top-level block of a 1024 x 1024 area (16 x 16 blocks)
+    conn = pyramid([(x, y) for x in range(1, 1025, 64) for y in range(1, 1025, 64)])
+    bounds = {'min_x': 1, 'max_x': 1024, 'min_y': 1, 'max_y': 1024}
+    result = overview.query(conn, bounds, GRID, LEVELS)
+
+    assert result['level'] == LEVELS
+    assert result['clamped'] is True
+    served = result['bounds']
+    assert served['max_x'] - served['min_x'] + 1 == GRID * 8 ** LEVELS
+    assert served['max_y'] - served['min_y'] + 1 == GRID * 8 ** LEVELS
+    assert (served['min_x'] + served['max_x']) // 2 == (bounds['min_x'] + bounds['max_x']) // 2
+    # An unaligned viewport can touch one more block per side than `grid`
+    assert 0 < len(result['blocks']) <= (GRID + 1) ** 2